@@ -0,0 +1,44 @@
+from django.core.files.storage import default_storage
+from django.utils.translation import gettext_lazy as _
+from drf_extra_fields.fields import Base64FileField
+from rest_framework import serializers
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class RawBase64ImageField(Base64FileField):
+    """Изображение в base64, сохраняемое без декодирования пикселей.
+
+    Тип определяется по сигнатуре файла; полная проверка, пережатие и
+    уменьшение выполняются фоновым воркером process_images.
+    """
+    ALLOWED_TYPES = ('jpg', 'png', 'gif')
+    INVALID_FILE_MESSAGE = _('Please upload a valid image.')
+    INVALID_TYPE_MESSAGE = _("The type of the image couldn't be determined.")
+
+    def get_file_extension(self, filename, decoded_file):
+        for signature, extension in IMAGE_SIGNATURES:
+            if decoded_file.startswith(signature):
+                return extension
+        return None
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Абсолютные URL версий изображения: {размер: {формат: url}}."""
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        result = {}
+        for name, formats in renditions.items():
+            result[name] = {}
+            for extension, path in formats.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                result[name][extension] = url
+        return result
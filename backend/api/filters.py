@@ -1,15 +1,16 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Recipe, Tag
+from recipes.models import Favorite, Recipe, RecipeTag, ShoppingCart, Tag
 
 FILTER_CHOICES = (('0', False), ('1', True))
 
 
-def get_filtered_queryset(queryset, recipes, value):
-    return (
-        queryset.filter(id__in=recipes)
-        if dict(FILTER_CHOICES)[value]
-        else queryset.exclude(id__in=recipes)
+def get_filtered_queryset(queryset, model, user, value):
+    """EXISTS / NOT EXISTS по записям model пользователя для рецепта."""
+    records = Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+    return queryset.filter(
+        records if dict(FILTER_CHOICES)[value] else ~records
     )
 
 
@@ -25,16 +26,14 @@ class RecipeFilter(django_filters.FilterSet):
     def is_favorited_method(self, queryset, name, value):
         user = self.request.user
         if user.is_anonymous:
-            return Recipe.objects.none()
-        recipes = user.favorites.values('recipe__id')
-        return get_filtered_queryset(queryset, recipes, value)
+            return queryset.none()
+        return get_filtered_queryset(queryset, Favorite, user, value)
 
     def is_in_shopping_cart_method(self, queryset, name, value):
         user = self.request.user
         if user.is_anonymous:
-            return Recipe.objects.none()
-        recipes = user.shopping_list.values('recipe__id')
-        return get_filtered_queryset(queryset, recipes, value)
+            return queryset.none()
+        return get_filtered_queryset(queryset, ShoppingCart, user, value)
 
     author = django_filters.NumberFilter(
         field_name='author', lookup_expr='exact'
@@ -43,8 +42,26 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='tags_method',
     )
 
+    def tags_method(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, без JOIN и DISTINCT."""
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
+
+    search = django_filters.CharFilter(method='search_method', max_length=200)
+
+    def search_method(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с ранжированием."""
+        value = value.strip()
+        if not value:
+            return queryset
+        return queryset.search(value)
+
     class Meta:
         model = Recipe
-        fields = ('author', 'tags')
+        fields = ('author', 'tags', 'search')
@@ -0,0 +1,56 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from recipes.versions import get_model_version
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+
+class IngredientPrefixIndex:
+    """Отсортированный индекс ингредиентов для поиска по началу названия.
+
+    Хранит (casefold(name), ингредиент) в памяти процесса и
+    перестраивается, когда меняется версия модели Ingredient.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (None, [], [])
+
+    def _build(self, version):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        return version, keys, items
+
+    def _get_state(self):
+        version = get_model_version(Ingredient)
+        if self._state[0] != version:
+            with self._lock:
+                if self._state[0] != version:
+                    self._state = self._build(version)
+        return self._state
+
+    def search(self, prefix, limit=INGREDIENT_SEARCH_LIMIT):
+        """Ингредиенты, название которых начинается с prefix."""
+        _, keys, items = self._get_state()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        result = []
+        for index in range(start, min(start + limit, len(keys))):
+            if not keys[index].startswith(prefix):
+                break
+            result.append(items[index])
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,213 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.serializers import ListSerializer, Serializer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = tuple(256 * 4 ** power for power in range(9))
+
+# Статистика текущего запроса; None вне запроса, например в командах.
+current_stats = ContextVar('current_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса: SQL и время сериализации."""
+
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def format_labels(names, values, extra=''):
+    labels = [
+        f'{name}="{escape(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        with self.lock:
+            series = sorted(
+                (values, self.copy(data))
+                for values, data in self.series.items()
+            )
+        for values, data in series:
+            lines.extend(self.render_series(values, data))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    @staticmethod
+    def copy(data):
+        return data
+
+    def inc(self, values, amount=1):
+        with self.lock:
+            self.series[values] = self.series.get(values, 0) + amount
+
+    def render_series(self, values, data):
+        yield f'{self.name}{format_labels(self.labels, values)} {data}'
+
+
+class Histogram(Metric):
+    """Гистограмма: счётчики по корзинам, сумма и число наблюдений."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    @staticmethod
+    def copy(data):
+        return list(data)
+
+    def observe(self, values, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            data = self.series.get(values)
+            if data is None:
+                data = self.series[values] = [0] * (len(self.buckets) + 3)
+            data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render_series(self, values, data):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), data):
+            cumulative += count
+            labels = format_labels(self.labels, values, f'le="{bound}"')
+            yield f'{self.name}_bucket{labels} {cumulative}'
+        labels = format_labels(self.labels, values)
+        yield f'{self.name}_sum{labels} {data[-2]}'
+        yield f'{self.name}_count{labels} {data[-1]}'
+
+
+class Registry:
+    def __init__(self, *metrics):
+        self.metrics = metrics
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+requests_total = Counter(
+    'foodgram_requests_total', 'Обработанные запросы.',
+    ('view', 'method', 'status'),
+)
+request_duration = Histogram(
+    'foodgram_request_duration_seconds', 'Время обработки запроса.',
+    ('view', 'method'), DURATION_BUCKETS,
+)
+db_queries = Histogram(
+    'foodgram_request_db_queries', 'SQL-запросов за запрос.',
+    ('view',), QUERY_BUCKETS,
+)
+db_duration = Histogram(
+    'foodgram_request_db_duration_seconds', 'Время SQL-запросов за запрос.',
+    ('view',), DURATION_BUCKETS,
+)
+serializer_duration = Histogram(
+    'foodgram_request_serializer_duration_seconds',
+    'Время сериализации ответа.',
+    ('view',), DURATION_BUCKETS,
+)
+response_size = Histogram(
+    'foodgram_response_size_bytes', 'Размер тела ответа.',
+    ('view',), SIZE_BUCKETS,
+)
+registry = Registry(
+    requests_total, request_duration, db_queries, db_duration,
+    serializer_duration, response_size,
+)
+
+
+def can_read_metrics(request):
+    """Администратор или запрос с токеном METRICS_TOKEN."""
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(
+        header.encode(), f'Bearer {token}'.encode()
+    )
+
+
+def timed_data(data_property):
+    """Свойство data, время которого учитывается в статистике запроса.
+
+    Считается только внешний вызов: вложенные сериализаторы работают
+    внутри него.
+    """
+    getter = data_property.fget
+
+    def data(self):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return getter(self)
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            stats.serializer_time += time.perf_counter() - start
+            stats.serializing = False
+
+    data.timed = True
+    return property(data)
+
+
+def instrument_serializers():
+    for serializer_class in (Serializer, ListSerializer):
+        data_property = serializer_class.__dict__['data']
+        if not getattr(data_property.fget, 'timed', False):
+            serializer_class.data = timed_data(data_property)
@@ -0,0 +1,120 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from api import metrics
+
+KNOWN_METHODS = frozenset((
+    'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS',
+))
+
+
+def get_view_name(view_func, method):
+    """Класс вьюсета и действие, например RecipeViewSet.favorite."""
+    view_class = getattr(view_func, 'cls', None) or getattr(
+        view_func, 'view_class', None
+    )
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    method = method.lower()
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+@contextmanager
+def capture_queries(stats):
+    """Учитывает в stats запросы ко всем базам данных."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(
+                connection.execute_wrapper(stats.record_query)
+            )
+        yield
+
+
+class PerformanceMiddleware:
+    """Время запроса, SQL и сериализации в Server-Timing и /metrics.
+
+    Server-Timing описывает работу до отдачи заголовков. Потоковый ответ
+    попадает в метрики, когда отдан целиком: в них учитываются и запросы,
+    выполненные при генерации его частей.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with capture_queries(stats):
+                response = self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+        duration = time.perf_counter() - start
+
+        view = getattr(request, 'metrics_view', 'unresolved')
+        response['Server-Timing'] = ', '.join((
+            f'total;dur={duration * 1e3:.1f};desc="{view}"',
+            f'db;dur={stats.db_time * 1e3:.1f};desc="{stats.queries} queries"',
+            f'serializer;dur={stats.serializer_time * 1e3:.1f}',
+        ))
+        if not response.streaming:
+            self.observe(
+                request, response, view, stats, duration,
+                len(response.content),
+            )
+        elif getattr(response, 'file_to_stream', None) is not None:
+            # Файл отдаётся как есть, возможно через wsgi.file_wrapper.
+            size = response.get('Content-Length')
+            self.observe(
+                request, response, view, stats, duration,
+                None if size is None else int(size),
+            )
+        else:
+            response.streaming_content = self.stream(
+                response.streaming_content,
+                request, response, view, stats, duration,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(view_func, request.method)
+
+    def stream(self, content, request, response, view, stats, duration):
+        """Отдаёт части ответа, считая время и запросы на их генерацию.
+
+        Обёртка БД ставится только на время получения очередной части,
+        поэтому между частями ничего не остаётся включённым.
+        """
+        size = 0
+        content = iter(content)
+        try:
+            while True:
+                start = time.perf_counter()
+                with capture_queries(stats):
+                    chunk = next(content, None)
+                duration += time.perf_counter() - start
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(request, response, view, stats, duration, size)
+
+    @staticmethod
+    def observe(request, response, view, stats, duration, size):
+        method = request.method
+        if method not in KNOWN_METHODS:
+            method = 'other'
+        metrics.requests_total.inc(
+            (view, method, f'{response.status_code // 100}xx')
+        )
+        metrics.request_duration.observe((view, method), duration)
+        metrics.db_queries.observe((view,), stats.queries)
+        metrics.db_duration.observe((view,), stats.db_time)
+        metrics.serializer_duration.observe((view,), stats.serializer_time)
+        if size is not None:
+            metrics.response_size.observe((view,), size)
@@ -0,0 +1,141 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag, urlencode
+
+from recipes.versions import get_model_versions
+
+REFERENCE_CACHE_MAX_AGE = 60
+RESPONSE_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_WAIT = 5
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+
+
+class VersionedETagMixin:
+    """Условный GET для справочников по версии моделей.
+
+    ETag строится из версий etag_models, пути запроса и Accept. Версии
+    берутся из кеша, поэтому ответ 304 обходится без запросов к базе.
+    """
+    etag_models = ()
+    cache_max_age = REFERENCE_CACHE_MAX_AGE
+
+    def get_etag(self, request):
+        versions = ':'.join(map(str, get_model_versions(*self.etag_models)))
+        accept = request.META.get('HTTP_ACCEPT', '')
+        return quote_etag(hashlib.md5(
+            f'{request.get_full_path()}:{accept}:{versions}'.encode()
+        ).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = self.get_etag(request)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=self.cache_max_age,
+            must_revalidate=True,
+        )
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """Кеш ответов list и retrieve для анонимных запросов.
+
+    Ключ строится из адреса, Accept, нормализованной строки запроса и версий
+    cache_models, поэтому любая запись в эти модели делает старые ключи
+    недостижимыми без перебора кеша. Промах вычисляется одним запросом:
+    остальные ждут, пока он положит ответ в кеш.
+    """
+    cache_models = ()
+    cache_actions = ('list', 'retrieve')
+    response_cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def is_response_cacheable(self, request):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        return (
+            request.method in ('GET', 'HEAD')
+            and action in self.cache_actions
+            and 'HTTP_AUTHORIZATION' not in request.META
+        )
+
+    def get_response_cache_key(self, request):
+        query = urlencode(sorted(
+            (key, sorted(values)) for key, values in request.GET.lists()
+        ), doseq=True)
+        versions = ':'.join(map(
+            str, get_model_versions(*self.cache_models)
+        ))
+        accept = request.META.get('HTTP_ACCEPT', '')
+        # Тело содержит абсолютные ссылки, поэтому схема и хост входят в ключ.
+        url = request.build_absolute_uri(request.path)
+        return 'response:' + hashlib.md5(
+            f'{url}?{query}:{accept}:{versions}'.encode()
+        ).hexdigest()
+
+    @staticmethod
+    def get_cached_response(key):
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def wait_for_cached_response(self, key, lock_key):
+        """Ждёт ответа вычисляющего запроса, пока тот держит блокировку.
+
+        Ответы кроме 200 не кешируются: после снятия блокировки без
+        ответа в кеше запрос вычисляется сам, не дожидаясь таймаута.
+        """
+        deadline = time.monotonic() + RESPONSE_CACHE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(RESPONSE_CACHE_POLL_INTERVAL)
+            response = self.get_cached_response(key)
+            if response is not None:
+                return response
+            if cache.get(lock_key) is None:
+                return None
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        response = self.get_cached_response(key)
+        if response is not None:
+            return response
+
+        lock_key = f'{key}:lock'
+        locked = cache.add(lock_key, 1, timeout=RESPONSE_CACHE_LOCK_TIMEOUT)
+        if not locked:
+            response = self.wait_for_cached_response(key, lock_key)
+            if response is not None:
+                return response
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code == 200:
+                response.render()
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    timeout=self.response_cache_timeout,
+                )
+                response['X-Cache'] = 'MISS'
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return response
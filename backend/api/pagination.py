@@ -1,5 +1,146 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с опциональным режимом keyset-курсора.
+
+    Курсорный режим включается параметром ?cursor= у вьюсетов с атрибутом
+    cursor_ordering и не выполняет ни COUNT, ни OFFSET; общее количество
+    считается только по запросу ?count=1.
+    """
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_page_size = 10
+    invalid_cursor_message = 'Invalid cursor'
+    cursor_required = False
+
+    def get_cursor_ordering(self, view):
+        return getattr(view, 'cursor_ordering', None)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.get_cursor_ordering(view)
+        self.use_cursor = self.ordering is not None and (
+            self.cursor_required
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = self.count_rows(queryset)
+        page_size = self.get_page_size(request) or self.cursor_page_size
+        results = self.get_keyset_rows(
+            queryset, self.decode_cursor(request), page_size + 1
+        )
+        self.has_next = len(results) > page_size
+        self.keyset_page = results[:page_size]
+        return self.keyset_page
+
+    def count_rows(self, queryset):
+        return queryset.count()
+
+    def get_keyset_rows(self, queryset, position, limit):
+        """Первые limit строк после позиции курсора."""
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return list(queryset[:limit])
+
+    def get_keyset_filter(self, position):
+        """Условие (a, b, ...) > (x, y, ...) с учётом направления полей."""
+        keyset_filter = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset_filter |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return keyset_filter
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            position.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(position, list)
+            or len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.keyset_page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response.move_to_end('count', last=False)
+        return Response(response)
+
+
+class FeedPagination(CustomPagination):
+    """Ленту листают только курсором по времени публикации записи.
+
+    Лента собирается из нескольких querysets с общими ключами сортировки:
+    страница каждого выбирается по тому же курсору, затем они сливаются.
+    """
+    cursor_ordering = ('-feed_date', '-feed_id')
+    cursor_required = True
+
+    def get_cursor_ordering(self, view):
+        return self.cursor_ordering
+
+    def count_rows(self, querysets):
+        return sum(queryset.count() for queryset in querysets)
+
+    def get_keyset_rows(self, querysets, position, limit):
+        rows = []
+        for queryset in querysets:
+            rows.extend(super().get_keyset_rows(queryset, position, limit))
+        rows.sort(key=lambda row: (row.feed_date, row.feed_id), reverse=True)
+        return rows[:limit]
@@ -1,5 +1,10 @@
+import csv
+import hashlib
 import io
+from functools import lru_cache
 
+from django.conf import settings
+from django.core.cache import cache
 from reportlab.lib.colors import Color
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
@@ -12,6 +17,16 @@ from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer
 w, h = A4
 PAGE_HEIGHT = h
 PAGE_WIDTH = w
+PDF_CACHE_VERSION = 1
+PDF_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """Регистрирует шрифт DejaVuSerif один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(
+        'DejaVuSerif', settings.BASE_DIR / 'DejaVuSerif.ttf', 'UTF-8'
+    ))
 
 
 class NumberedCanvas(canvas.Canvas):
@@ -85,6 +100,31 @@ def get_shopping_list_text(
     )
 
 
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def stream_txt_from_queryset(queryset):
+    """Построчно отдаёт список покупок, не загружая его целиком."""
+    for items in queryset.iterator():
+        yield get_shopping_list_text(**items) + '\n'
+
+
+def stream_csv_from_queryset(queryset):
+    """Построчно отдаёт список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['name', 'measurement_unit', 'amount'])
+    for items in queryset.iterator():
+        yield writer.writerow([
+            items['ingredient__name'],
+            items['ingredient__measurement_unit'],
+            items['amount'],
+        ])
+
+
 def create_pdf_from_queryset(queryset, username):
     SIZE_NUM = 0.75
     SPACE_NUM = 2.5
@@ -98,7 +138,7 @@ def create_pdf_from_queryset(queryset, username):
         topMargin=1 * inch,
         bottomMargin=1 * inch,
     )
-    pdfmetrics.registerFont(TTFont('DejaVuSerif', 'DejaVuSerif.ttf', 'UTF-8'))
+    register_fonts()
     doc.title = f'Список покупок для {username}'
     story = [Spacer(SPACE_NUM, SIZE_NUM * inch)]
     for items in queryset:
@@ -107,9 +147,29 @@ def create_pdf_from_queryset(queryset, username):
     story.append(PageBreak())
     doc.build(
         story,
-        onFirstPage=my_first_page,
-        onLaterPages=my_later_pages,
+        onFirstPage=first_page,
+        onLaterPages=later_pages,
         canvasmaker=NumberedCanvas,
     )
     pdf_file.seek(0)
     return pdf_file
+
+
+def get_pdf_cache_key(items, username):
+    """Ключ кэша из версии отчёта, имени и содержимого списка покупок."""
+    digest = hashlib.sha256(username.encode())
+    for item in items:
+        digest.update(get_shopping_list_text(**item).encode())
+        digest.update(b'\n')
+    return f'shopping_cart_pdf:{PDF_CACHE_VERSION}:{digest.hexdigest()}'
+
+
+def get_cached_pdf_from_queryset(queryset, username):
+    """PDF из кэша; любое изменение корзины меняет ключ."""
+    items = list(queryset)
+    key = get_pdf_cache_key(items, username)
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = create_pdf_from_queryset(items, username).getvalue()
+        cache.set(key, pdf, PDF_CACHE_TIMEOUT)
+    return io.BytesIO(pdf)
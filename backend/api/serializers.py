@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.fields import ImageRenditionsField, RawBase64ImageField
+from recipes.images import (attach_stored_image, enqueue_image_processing,
+                            find_stored_image)
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             RecipeTag, ShoppingCart, Tag)
 from users.serializers import CustomUserSerializer
@@ -10,6 +12,7 @@ from users.serializers import CustomUserSerializer
 User = get_user_model()
 
 MAX_VALUE = 32000
+MAX_BATCH_SIZE = 100
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -29,52 +32,57 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['name', 'color']
 
 
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    """Сериализатор модели, связывающей ингредиенты и рецепт."""
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ['id', 'name', 'measurement_unit', 'amount']
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Рецепты."""
-    image = Base64ImageField()
+    image = RawBase64ImageField()
+    image_renditions = ImageRenditionsField()
     author = CustomUserSerializer(read_only=True)
-    ingredients = IngredientSerializer(many=True)
+    ingredients = RecipeIngredientSerializer(
+        source='recipeingredient_set', many=True, read_only=True)
     tags = TagSerializer(many=True)
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited', read_only=True)
-    is_in_shoppingcart = serializers.SerializerMethodField(
-        method_name='get_is_in_shoppingcart', read_only=True)
+    is_in_shopping_cart = serializers.SerializerMethodField(
+        method_name='get_is_in_shopping_cart', read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'name', 'text', 'ingredients',
                   'tags', 'cooking_time', 'is_favorited',
-                  'is_in_shoppingcart', 'image')
+                  'is_in_shopping_cart', 'image', 'image_status',
+                  'image_renditions')
         read_only_fields = ('is_favorited', 'is_in_shopping_cart')
 
-    def get_ingredients(self, obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
-        return RecipeIngredientSerializer(ingredients, many=True).data
-
     def get_is_favorited(self, obj):
+        """Флаг из аннотации RecipeQuerySet.with_user_flags."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return obj.in_favorited.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        """Флаг из аннотации RecipeQuerySet.with_user_flags."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
-        return obj.is_in_shoppingcart.filter(user=user).exists()
-
-
-class RecipeIngredientSerializer(serializers.ModelSerializer):
-    """Сериализатор модели, связывающей ингредиенты и рецепт."""
-    id = serializers.ReadOnlyField(source='ingredient.id')
-    name = serializers.ReadOnlyField(source='ingredient.name')
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit'
-    )
-
-    class Meta:
-        model = RecipeIngredient
-        fields = ['__all__']
+        return obj.in_shopping_cart.filter(user=user).exists()
 
 
 class AddIngredientRecipeSerializer(serializers.ModelSerializer):
@@ -91,10 +99,8 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор создания или обновления рецепта."""
     author = CustomUserSerializer(read_only=True)
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RawBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -110,8 +116,18 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['author']
 
-    def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
+    def validate_tags(self, tag_ids):
+        """Все теги одним запросом; ошибка сразу по всем неизвестным id."""
+        tags = Tag.objects.in_bulk(tag_ids)
+        missing = [tag_id for tag_id in tag_ids if tag_id not in tags]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {", ".join(map(str, missing))}'
+            )
+        return [tags[tag_id] for tag_id in dict.fromkeys(tag_ids)]
+
+    def validate_ingredients(self, ingredients):
+        """Проверка количеств и всех id ингредиентов одним запросом."""
         ingredients_data = set()
         for element in ingredients:
             amount = element['amount']
@@ -128,34 +144,120 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                     'ingredient': 'Ингредиенты должны быть уникальными!'
                 })
             ingredients_data.add(element['id'])
-        return data
+
+        resolved = Ingredient.objects.in_bulk(ingredients_data)
+        missing = [
+            element['id'] for element in ingredients
+            if element['id'] not in resolved
+        ]
+        if missing:
+            raise serializers.ValidationError({
+                'ingredient': 'Ингредиенты не найдены: '
+                              f'{", ".join(map(str, missing))}'
+            })
+        for element in ingredients:
+            element['ingredient'] = resolved[element['id']]
+        return ingredients
 
     @staticmethod
     def create_recipe_ingredients(ingredients, recipe):
         RecipeIngredient.objects.bulk_create(
             [
                 RecipeIngredient(
-                    recipe_id=recipe.id,
-                    ingredient_id=ingredient['id'],
+                    recipe=recipe,
+                    ingredient=ingredient['ingredient'],
                     amount=ingredient['amount'],
                 )
                 for ingredient in ingredients
             ]
         )
 
-    def tag(self, tags, recipe):
-        recipe_tags = [RecipeTag(recipe=recipe, tag=tag) for tag in tags]
-        RecipeTag.objects.bulk_create(recipe_tags)
+    @staticmethod
+    def update_recipe_ingredients(ingredients, recipe):
+        """Пишет только разницу между текущими и новыми ингредиентами."""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        removed = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in current
+        ]
+
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            CreateRecipeSerializer.create_recipe_ingredients(added, recipe)
+
+    @staticmethod
+    def update_recipe_tags(tags, recipe):
+        """Удаляет снятые теги и добавляет новые, не трогая остальные."""
+        tag_ids = {tag.id for tag in tags}
+        current = set(RecipeTag.objects.filter(
+            recipe=recipe
+        ).values_list('tag_id', flat=True))
+        if current - tag_ids:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=current - tag_ids
+            ).delete()
+        if tag_ids - current:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in tag_ids - current
+            )
+
+    @staticmethod
+    def use_stored_image(validated_data):
+        """Подставляет уже сохранённое изображение с теми же байтами.
+
+        Тогда исходник не пишется на диск и задача воркеру не ставится.
+        """
+        image = validated_data['image']
+        stored = find_stored_image(image.read())
+        image.seek(0)
+        if stored is not None:
+            validated_data['image'] = stored.image
+        return stored
+
+    @staticmethod
+    def attach_image(recipe, stored):
+        if stored is None:
+            enqueue_image_processing(recipe)
+        else:
+            attach_stored_image(recipe, stored)
 
     @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта только авторизованному пользователю."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        stored = self.use_stored_image(validated_data)
         recipe = Recipe.objects.create(**validated_data)
 
         self.create_recipe_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags
+        )
+        self.attach_image(recipe, stored)
         return recipe
 
     @transaction.atomic
@@ -163,13 +265,18 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         """Изменение рецепта автором рецепта."""
         tags = validated_data.pop('tags', None)
         if tags is not None:
-            instance.tags.set(tags)
+            self.update_recipe_tags(tags, instance)
 
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is not None:
-            instance.ingredients.clear()
-        self.create_recipe_ingredients(ingredients, instance)
-        return super().update(instance, validated_data)
+            self.update_recipe_ingredients(ingredients, instance)
+        image_changed = 'image' in validated_data
+        if image_changed:
+            stored = self.use_stored_image(validated_data)
+        recipe = super().update(instance, validated_data)
+        if image_changed:
+            self.attach_image(recipe, stored)
+        return recipe
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context={
@@ -179,7 +286,17 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
 class FavoritListSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения избранного."""
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_renditions', 'cooking_time']
+
+
+class BatchIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
@@ -0,0 +1,770 @@
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import report
+from recipes import timeline
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag, TimelineEntry)
+from users.models import Follow, User
+
+RECIPES_COUNT = 12
+PAGE_SIZES = (1, 5, RECIPES_COUNT)
+# Токен с пользователем, COUNT, страница, теги, ингредиенты, подписки.
+AUTHENTICATED_QUERIES = 6
+# Версии данных для ключа кеша, COUNT, страница, теги, ингредиенты.
+ANONYMOUS_QUERIES = 5
+
+
+def create_user(name, **fields):
+    return User.objects.create(
+        username=name, email=f'{name}@example.com', **fields
+    )
+
+
+def create_recipe(author, name='recipe', **fields):
+    return Recipe.objects.create(
+        author=author, name=name, image='recipes/images/recipe.png',
+        text='text', cooking_time=10, **fields
+    )
+
+
+def get_client(user=None):
+    """Клиент с токеном user; без user — анонимный."""
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    return client
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        authors = [
+            User.objects.create(
+                username=f'author_{num}', email=f'author_{num}@example.com'
+            )
+            for num in range(3)
+        ]
+        Follow.objects.create(user=cls.user, author=authors[0])
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E'))
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'ingredient_{num}',
+                                      measurement_unit='г')
+            for num in range(3)
+        ]
+        for num in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[num % len(authors)],
+                name=f'recipe_{num}',
+                image='recipes/images/recipe.png',
+                text='text',
+                cooking_time=10,
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=num + 1)
+                for ingredient in ingredients[:2]
+            )
+            if num % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if num % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous_client = APIClient()
+        self.authorized_client = APIClient()
+        # Заголовок, а не force_authenticate: анонимный кеш ответов
+        # пропускает только запросы с Authorization.
+        self.authorized_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token}'
+        )
+
+    def assert_list_queries(self, client, queries):
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_authenticated_list_queries(self):
+        self.assert_list_queries(
+            self.authorized_client, AUTHENTICATED_QUERIES
+        )
+
+    def test_anonymous_list_queries(self):
+        self.assert_list_queries(self.anonymous_client, ANONYMOUS_QUERIES)
+
+    def test_anonymous_cached_list_queries(self):
+        self.anonymous_client.get('/api/recipes/', {'limit': 5})
+        with self.assertNumQueries(0):
+            response = self.anonymous_client.get(
+                '/api/recipes/', {'limit': 5}
+            )
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_user_flags(self):
+        response = self.authorized_client.get(
+            '/api/recipes/', {'limit': RECIPES_COUNT}
+        )
+        flags = {
+            recipe['name']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart']
+            )
+            for recipe in response.data['results']
+        }
+        for num in range(RECIPES_COUNT):
+            with self.subTest(num=num):
+                self.assertEqual(
+                    flags[f'recipe_{num}'], (bool(num % 2), bool(num % 3))
+                )
+
+
+class RecipeSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        now = timezone.now()
+        for age, name, text in (
+            (4, 'Летний салат', 'Огурцы и помидоры'),
+            (3, 'Борщ', 'Свёкла, капуста и летний укроп'),
+            (2, 'Зимний салат', 'Капуста'),
+            (1, 'Суп', 'Лёгкий летний салат к супу'),
+        ):
+            recipe = Recipe.objects.create(
+                author=author, name=name, text=text,
+                image='recipes/images/recipe.png', cooking_time=10,
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(days=age)
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, text):
+        response = self.client.get(
+            '/api/recipes/', {'search': text, 'limit': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_ignores_case_of_cyrillic(self):
+        expected = self.search('летний')
+        self.assertEqual(len(expected), 3)
+        for text in ('Летний', 'ЛЕТНИЙ', 'лЕТНИЙ'):
+            with self.subTest(text=text):
+                self.assertCountEqual(self.search(text), expected)
+
+    def test_requires_every_word(self):
+        self.assertCountEqual(
+            self.search('ЛЕТНИЙ салат'), ['Летний салат', 'Суп']
+        )
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(
+            self.search('летний салат'), ['Летний салат', 'Суп']
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'pg_trgm есть в PostgreSQL')
+    def test_finds_name_with_typo(self):
+        self.assertEqual(self.search('борш'), ['Борщ'])
+
+
+class ReferenceETagTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, etag=None):
+        headers = {} if etag is None else {'HTTP_IF_NONE_MATCH': etag}
+        return self.client.get(path, **headers)
+
+    def test_not_modified_without_queries(self):
+        for path in ('/api/tags/', '/api/ingredients/'):
+            with self.subTest(path=path):
+                etag = self.get(path)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.get(path, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        for path, create in (
+            ('/api/tags/', lambda: Tag.objects.create(
+                name='dinner', color='#8775D2', slug='dinner'
+            )),
+            ('/api/ingredients/', lambda: Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            )),
+        ):
+            with self.subTest(path=path):
+                etag = self.get(path)['ETag']
+                with self.captureOnCommitCallbacks(execute=True):
+                    create()
+                response = self.get(path, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertEqual(len(response.json()), 1)
+
+    def test_ingredient_search_sees_new_ingredient(self):
+        self.assertEqual(
+            self.client.get('/api/ingredients/', {'name': 'Сол'}).json(), []
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in self.client.get(
+                '/api/ingredients/', {'name': 'сол'}
+            ).json()],
+            ['Соль'],
+        )
+
+
+@override_settings(METRICS_TOKEN='metrics-secret')
+class MetricsAccessTest(TestCase):
+    def test_hidden_from_anonymous_and_users(self):
+        user = User.objects.create(username='user', email='user@example.com')
+        for headers in (
+            {},
+            {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+            {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=user)}'},
+        ):
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.client.get('/metrics', **headers).status_code, 404
+                )
+
+    def test_available_with_token(self):
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer metrics-secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'foodgram_requests_total', response.content)
+
+    def test_available_to_staff(self):
+        self.client.force_login(User.objects.create(
+            username='admin', email='admin@example.com', is_staff=True
+        ))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_is_not_accepted(self):
+        self.assertEqual(
+            self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer '
+            ).status_code,
+            404,
+        )
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.recipes = [
+            create_recipe(author, f'recipe_{num}') for num in range(7)
+        ]
+        now = timezone.now()
+        # Одинаковое время у соседних рецептов проверяет второй ключ.
+        for num, recipe in enumerate(cls.recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now + timedelta(minutes=num // 2)
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = get_client(create_user('reader'))
+
+    def test_walks_all_pages_in_order(self):
+        url = '/api/recipes/?cursor=&limit=3'
+        pages = []
+        while url:
+            # Как у постраничного списка, но без COUNT.
+            with self.assertNumQueries(AUTHENTICATED_QUERIES - 1):
+                data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            pages.append([recipe['id'] for recipe in data['results']])
+            url = data['next']
+        self.assertEqual(
+            pages,
+            [
+                [recipe.id for recipe in self.recipes[start:start + 3]]
+                for start in range(0, len(self.recipes), 3)
+            ],
+        )
+
+    def test_count_on_request(self):
+        data = self.client.get(
+            '/api/recipes/', {'cursor': '', 'limit': 3, 'count': 1}
+        ).json()
+        self.assertEqual(data['count'], len(self.recipes))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'WzFd', 'WyJ4IiwgMV0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class FeedTest(TestCase):
+    """Лента сливает записи ленты и рецепты тяжёлых авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        light = create_user('light')
+        heavy = create_user('heavy')
+        stranger = create_user('stranger')
+        for author in (light, heavy):
+            Follow.objects.create(user=cls.user, author=author)
+        User.objects.filter(pk=heavy.pk).update(
+            followers_count=timeline.FEED_FANOUT_MAX_FOLLOWERS + 1
+        )
+        recipes = [
+            create_recipe(author, f'recipe_{num}')
+            for num in range(4)
+            for author in (light, heavy, stranger)
+        ]
+        now = timezone.now()
+        # Одинаковое время у соседних рецептов проверяет второй ключ.
+        for num, recipe in enumerate(recipes):
+            pub_date = now + timedelta(minutes=num // 2)
+            Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+            TimelineEntry.objects.filter(recipe=recipe).update(
+                pub_date=pub_date
+            )
+        cls.expected = [
+            recipe.id for recipe in Recipe.objects.filter(
+                author__in=(light, heavy)
+            ).order_by('-pub_date', '-id')
+        ]
+
+    def test_merges_sources_in_order(self):
+        self.assertFalse(
+            TimelineEntry.objects.filter(recipe__author__username='heavy')
+        )
+        client = get_client(self.user)
+        url = '/api/recipes/feed/?limit=3'
+        ids = []
+        entries = TimelineEntry.objects.count()
+        while url:
+            data = client.get(url).json()
+            self.assertLessEqual(len(data['results']), 3)
+            ids.extend(recipe['id'] for recipe in data['results'])
+            url = data['next']
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(TimelineEntry.objects.count(), entries)
+
+    def test_unfollowed_author_leaves_feed(self):
+        Follow.objects.filter(
+            user=self.user, author__username='light'
+        ).delete()
+        data = get_client(self.user).get('/api/recipes/feed/').json()
+        self.assertEqual(
+            {recipe['author']['username'] for recipe in data['results']},
+            {'heavy'},
+        )
+
+
+class RecordToggleTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.recipe = create_recipe(create_user('author'))
+
+    def setUp(self):
+        self.client = get_client(self.user)
+
+    def test_toggles_are_idempotent(self):
+        for name, model, counter in (
+            ('favorite', Favorite, 'favorites_count'),
+            ('shopping_cart', ShoppingCart, 'shopping_cart_count'),
+        ):
+            with self.subTest(name=name):
+                path = f'/api/recipes/{self.recipe.id}/{name}/'
+                for method, status, count in (
+                    ('post', 201, 1), ('post', 400, 1),
+                    ('delete', 204, 0), ('delete', 400, 0),
+                ):
+                    response = getattr(self.client, method)(path)
+                    self.assertEqual(response.status_code, status)
+                    self.assertEqual(
+                        model.objects.filter(user=self.user).count(), count
+                    )
+                    self.recipe.refresh_from_db()
+                    self.assertEqual(getattr(self.recipe, counter), count)
+
+
+class BatchRecordsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        cls.recipes = [
+            create_recipe(author, f'recipe_{num}') for num in range(6)
+        ]
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def setUp(self):
+        self.client = get_client(self.user)
+
+    def batch(self, method, ids):
+        response = getattr(self.client, method)(
+            '/api/recipes/batch/favorite/', {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            result['id']: result['status']
+            for result in response.json()['results']
+        }
+
+    def assert_counters(self, *counts):
+        self.assertEqual(
+            [recipe.favorites_count for recipe in Recipe.objects.filter(
+                pk__in=[recipe.id for recipe in self.recipes[:len(counts)]]
+            ).order_by('id')],
+            list(counts),
+        )
+
+    def check_statuses(self):
+        first, second, third = (recipe.id for recipe in self.recipes[:3])
+        missing = self.recipes[-1].id + 1
+        self.assertEqual(
+            self.batch('post', [first, second, second, missing]),
+            {
+                first: 'already_exists', second: 'created',
+                missing: 'not_found',
+            },
+        )
+        self.assert_counters(1, 1, 0)
+        self.assertEqual(
+            self.batch('delete', [first, third]),
+            {first: 'deleted', third: 'does_not_exist'},
+        )
+        self.assert_counters(0, 1, 0)
+
+    def test_statuses_and_counters(self):
+        self.check_statuses()
+
+    def test_statuses_and_counters_without_returning(self):
+        with mock.patch('api.utils.supports_returning', return_value=False):
+            self.check_statuses()
+
+    @skipUnless(
+        connection.vendor == 'postgresql'
+        or connection.Database.sqlite_version_info >= (3, 35),
+        'нужен RETURNING',
+    )
+    def test_queries_do_not_depend_on_batch_size(self):
+        counts = []
+        for recipes in (self.recipes[1:2], self.recipes[2:]):
+            with CaptureQueriesContext(connection) as queries:
+                self.batch('post', [recipe.id for recipe in recipes])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class AnonymousResponseCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = get_client()
+
+    def get_names(self, **headers):
+        response = self.client.get('/api/recipes/', **headers)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()]
+
+    def test_write_invalidates_cached_list(self):
+        self.assertEqual(self.get_names(), ['recipe'])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, 'new recipe')
+        self.assertCountEqual(self.get_names(), ['recipe', 'new recipe'])
+
+    def test_authenticated_requests_skip_cache(self):
+        self.get_names()
+        user = create_user('reader')
+        Favorite.objects.create(user=user, recipe=self.recipe)
+        response = get_client(user).get(f'/api/recipes/{self.recipe.id}/')
+        self.assertTrue(response.json()['is_favorited'])
+
+    def test_hosts_are_cached_separately(self):
+        for host in ('internal', 'public.example.com'):
+            with self.subTest(host=host):
+                response = self.client.get(
+                    f'/api/recipes/{self.recipe.id}/', HTTP_HOST=host
+                )
+                self.assertTrue(response.json()['image'].startswith(
+                    f'http://{host}/'
+                ))
+
+    def test_errors_are_not_cached(self):
+        pk = self.recipe.id + 1
+        path = f'/api/recipes/{pk}/'
+        self.assertEqual(self.client.get(path).status_code, 404)
+        # bulk_create не сдвигает версию: ответ 200 не мог прийти из кеша.
+        Recipe.objects.bulk_create([Recipe(
+            id=pk, author=self.author, name='late recipe',
+            image='recipes/images/recipe.png', text='text', cooking_time=10,
+        )])
+        self.assertEqual(self.client.get(path).status_code, 200)
+
+
+class ShoppingListExportTest(TestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        water = Ingredient.objects.create(name='вода', measurement_unit='мл')
+        for amount in (2, 3):
+            recipe = create_recipe(cls.user)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=salt, amount=amount
+                ),
+                RecipeIngredient(
+                    recipe=recipe, ingredient=water, amount=10 * amount
+                ),
+            ])
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = get_client(self.user)
+
+    def test_streams_text_formats(self):
+        for export_format, media_type, body in (
+            ('txt', 'text/plain', 'вода (мл) - 50\nсоль (г) - 5\n'),
+            ('csv', 'text/csv',
+             'name,measurement_unit,amount\r\n'
+             'вода,мл,50\r\nсоль,г,5\r\n'),
+        ):
+            with self.subTest(format=export_format):
+                response = self.client.get(
+                    self.url, {'format': export_format}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                self.assertTrue(response['Content-Type'].startswith(
+                    media_type
+                ))
+                self.assertEqual(
+                    b''.join(response.streaming_content).decode(), body
+                )
+
+    def test_unmatched_accept_falls_back_to_pdf(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(
+            b'%PDF'
+        ))
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_pdf_is_cached_until_cart_changes(self):
+        with mock.patch.object(
+            report, 'create_pdf_from_queryset',
+            wraps=report.create_pdf_from_queryset,
+        ) as create_pdf:
+            for _ in range(2):
+                self.assertEqual(
+                    self.client.get(self.url).status_code, 200
+                )
+            self.assertEqual(create_pdf.call_count, 1)
+            RecipeIngredient.objects.filter(
+                ingredient__name='соль'
+            ).update(amount=1)
+            self.client.get(self.url)
+            self.assertEqual(create_pdf.call_count, 2)
+
+
+class RecipeUpdateTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E'))
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient_{num}', measurement_unit='г'
+            )
+            for num in range(3)
+        ]
+        cls.recipe = create_recipe(cls.author)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=cls.recipe, ingredient=ingredient, amount=5
+            )
+            for ingredient in cls.ingredients[:2]
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=cls.recipe, tag=tag) for tag in cls.tags
+        )
+
+    def setUp(self):
+        self.client = get_client(self.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def rows(self, model, key):
+        return dict(
+            model.objects.filter(recipe=self.recipe).values_list(key, 'id')
+        )
+
+    def test_writes_only_the_difference(self):
+        ingredients = self.rows(RecipeIngredient, 'ingredient_id')
+        tags = self.rows(RecipeTag, 'tag_id')
+        kept, removed, added = self.ingredients
+        response = self.client.patch(self.url, {
+            'ingredients': [
+                {'id': kept.id, 'amount': 5},
+                {'id': added.id, 'amount': 3},
+            ],
+            'tags': [self.tags[0].id],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        new_ingredients = self.rows(RecipeIngredient, 'ingredient_id')
+        self.assertEqual(set(new_ingredients), {kept.id, added.id})
+        self.assertEqual(new_ingredients[kept.id], ingredients[kept.id])
+        self.assertEqual(
+            self.rows(RecipeTag, 'tag_id'),
+            {self.tags[0].id: tags[self.tags[0].id]},
+        )
+
+    def test_changed_amount_is_updated_in_place(self):
+        ingredients = self.rows(RecipeIngredient, 'ingredient_id')
+        response = self.client.patch(self.url, {'ingredients': [
+            {'id': ingredient.id, 'amount': 7}
+            for ingredient in self.ingredients[:2]
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.rows(RecipeIngredient, 'ingredient_id'), ingredients
+        )
+        self.assertEqual(
+            set(RecipeIngredient.objects.filter(
+                recipe=self.recipe
+            ).values_list('amount', flat=True)),
+            {7},
+        )
+
+    def test_patch_without_ingredients_keeps_them(self):
+        ingredients = self.rows(RecipeIngredient, 'ingredient_id')
+        response = self.client.patch(
+            self.url, {'name': 'renamed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.rows(RecipeIngredient, 'ingredient_id'), ingredients
+        )
+
+
+class RecipeFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E'))
+        ]
+        cls.recipes = [
+            create_recipe(cls.user, f'recipe_{num}') for num in range(3)
+        ]
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=cls.recipes[0], tag=cls.tags[0]),
+            RecipeTag(recipe=cls.recipes[0], tag=cls.tags[1]),
+            RecipeTag(recipe=cls.recipes[1], tag=cls.tags[1]),
+        ])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[2])
+
+    def get_ids(self, client, params):
+        data = client.get(
+            '/api/recipes/', {'limit': RECIPES_COUNT, **params}
+        ).json()
+        return sorted(recipe['id'] for recipe in data['results'])
+
+    def ids(self, *indexes):
+        return sorted(self.recipes[index].id for index in indexes)
+
+    def test_filters(self):
+        client = get_client(self.user)
+        for params, expected in (
+            ({'tags': ['breakfast', 'lunch']}, self.ids(0, 1)),
+            ({'tags': 'breakfast'}, self.ids(0)),
+            ({'is_favorited': 1}, self.ids(0)),
+            ({'is_favorited': 0}, self.ids(1, 2)),
+            ({'is_in_shopping_cart': 1}, self.ids(2)),
+            ({'is_in_shopping_cart': 0, 'tags': 'lunch'}, self.ids(0, 1)),
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.get_ids(client, params), expected)
+
+    def test_anonymous_record_filters_are_empty(self):
+        self.assertEqual(
+            self.get_ids(get_client(), {'is_favorited': 1}), []
+        )
+
+
+class RecipeCreateValidationTest(TestCase):
+    def test_reports_all_unknown_ids_at_once(self):
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        response = get_client(create_user('author')).post(
+            '/api/recipes/', {
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 1},
+                    {'id': ingredient.id + 1, 'amount': 1},
+                    {'id': ingredient.id + 2, 'amount': 1},
+                ],
+                'tags': [998, 999],
+                'name': 'recipe', 'text': 'text', 'cooking_time': 10,
+            }, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors['tags'], ['Теги не найдены: 998, 999'])
+        self.assertEqual(
+            errors['ingredients']['ingredient'],
+            f'Ингредиенты не найдены: {ingredient.id + 1}, '
+            f'{ingredient.id + 2}',
+        )
+        self.assertFalse(Recipe.objects.exists())
@@ -1,8 +1,14 @@
 from typing import Dict
 
+from django.db import connections, router, transaction
+from django.db.models import sql
 from rest_framework import exceptions, status
 from rest_framework.response import Response
 
+from recipes.counters import (RECORD_COUNTERS, change_record_counter,
+                              change_record_counters)
+from recipes.signals import records_changed, send_records_changed
+
 
 FIVE_NUM = 5
 TWO_NUM = 2
@@ -19,19 +25,153 @@ def get_end_letter(value):
     return ''
 
 
-def create_or_delete_record(request, record, serializer_data, params):
-    if request.method == 'POST':
+def insert_ignore_conflicts(model, **values):
+    """Один INSERT, пропускающий конфликт уникальности.
+
+    Возвращает число вставленных строк: 0, если запись уже была.
+    """
+    using = router.db_for_write(model)
+    query = sql.InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(
+        [model._meta.get_field(name) for name in values], [model(**values)]
+    )
+    with connections[using].cursor() as cursor:
+        for statement, params in query.get_compiler(using).as_sql():
+            cursor.execute(statement, params)
+        return cursor.rowcount
+
+
+def delete_rows(queryset):
+    """Один DELETE без выборки объектов; возвращает число строк."""
+    return queryset._raw_delete(queryset.db)
 
-        if record.exists():
-            raise exceptions.ValidationError('records already exists.')
 
-        record.create(user=request.user, **params)
-        return Response(serializer_data, status=status.HTTP_201_CREATED)
+@transaction.atomic
+def create_or_delete_record(request, model, serializer, **values):
+    """Идемпотентное добавление или удаление записи одним запросом.
+
+    post_save и post_delete при этом не отправляются, поэтому счётчик
+    записи обновляется и records_changed отправляется здесь же.
+    """
+    values['user'] = request.user
+    if request.method == 'POST':
+        if not insert_ignore_conflicts(model, **values):
+            raise exceptions.ValidationError('records already exists.')
+        change_record_counter(model(**values), 1)
+        send_records_changed(model(**values), 1)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     if request.method == 'DELETE':
-        if not record.exists():
+        if not delete_rows(model.objects.filter(**values)):
             raise exceptions.ValidationError('records does not exists.')
-        record.delete()
+        change_record_counter(model(**values), -1)
+        send_records_changed(model(**values), -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+def supports_returning(connection):
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def write_records_returning(model, user, target_field, target_ids, insert):
+    """INSERT ... ON CONFLICT DO NOTHING или DELETE с RETURNING.
+
+    Возвращает id целей строк, которые этот запрос действительно вставил
+    или удалил: параллельная запись той же строки в них не попадёт.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    user_column = quote(model._meta.get_field('user').column)
+    target_column = quote(model._meta.get_field(target_field).column)
+    if insert:
+        statement = (
+            f'INSERT INTO {table} ({user_column}, {target_column}) VALUES '
+            + ', '.join(['(%s, %s)'] * len(target_ids))
+            + f' ON CONFLICT DO NOTHING RETURNING {target_column}'
+        )
+        params = [value for pk in target_ids for value in (user.pk, pk)]
+    else:
+        statement = (
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {target_column} IN ({", ".join(["%s"] * len(target_ids))})'
+            f' RETURNING {target_column}'
+        )
+        params = [user.pk, *target_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def write_records(model, user, target_field, target_ids, insert):
+    """id целей, для которых запись действительно вставлена или удалена."""
+    if not target_ids:
+        return []
+    if supports_returning(connections[router.db_for_write(model)]):
+        return write_records_returning(
+            model, user, target_field, target_ids, insert
+        )
+    # Без RETURNING результат каждой строки виден только по rowcount.
+    target_attname = model._meta.get_field(target_field).attname
+    if insert:
+        return [
+            pk for pk in target_ids
+            if insert_ignore_conflicts(model, user=user, **{
+                target_attname: pk
+            })
+        ]
+    return [
+        pk for pk in target_ids
+        if delete_rows(model.objects.filter(user=user, **{
+            target_attname: pk
+        }))
+    ]
+
+
+@transaction.atomic
+def create_or_delete_records(request, model, targets, ids, excluded=()):
+    """Пакетное добавление или удаление записей model для списка ids.
+
+    Все id проверяются одним запросом, записи вставляются и удаляются
+    пачкой. Результаты и счётчики считаются по строкам, которые запись
+    действительно изменила, а не по предварительному чтению.
+    """
+    _, _, target_field = RECORD_COUNTERS[model]
+    ids = list(dict.fromkeys(ids))
+    found = set(targets.filter(pk__in=ids).values_list('pk', flat=True))
+    valid = [pk for pk in ids if pk in found and pk not in excluded]
+
+    if request.method == 'POST':
+        delta = 1
+        done, skipped = 'created', 'already_exists'
+    elif request.method == 'DELETE':
+        delta = -1
+        done, skipped = 'deleted', 'does_not_exist'
+    else:
+        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    changed = write_records(
+        model, request.user, target_field, valid, insert=delta > 0
+    )
+    change_record_counters(model, changed, delta)
+    if changed:
+        records_changed.send(
+            sender=model, user_id=request.user.id,
+            target_ids=changed, delta=delta,
+        )
+    changed = set(changed)
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = 'not_found'
+        elif pk in excluded:
+            result = 'invalid'
+        else:
+            result = done if pk in changed else skipped
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results})
@@ -1,30 +1,53 @@
 from django.contrib.auth import get_user_model
 from django.db.models import Sum
-from django.http import FileResponse
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
+from api import metrics
 from api.filters import RecipeFilter
-from api.pagination import CustomPagination
-from api.report import create_pdf_from_queryset
-from api.serializers import (CreateRecipeSerializer, IngredientSerializer, RecipeSerializer,
-                             TagSerializer, FavoritListSerializer)
-from api.utils import create_or_delete_record
-from recipes.models import (Ingredient, Recipe, Tag, RecipeIngredient)
+from api.ingredient_index import ingredient_index
+from api.mixins import AnonymousResponseCacheMixin, VersionedETagMixin
+from api.pagination import CustomPagination, FeedPagination
+from api.renderers import (CSVRenderer, FallbackContentNegotiation,
+                           PDFRenderer, PlainTextRenderer)
+from api.report import (get_cached_pdf_from_queryset,
+                        stream_csv_from_queryset, stream_txt_from_queryset)
+from api.serializers import (BatchIdsSerializer, CreateRecipeSerializer,
+                             FavoritListSerializer, IngredientSerializer,
+                             RecipeSerializer, TagSerializer)
+from api.utils import create_or_delete_record, create_or_delete_records
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.timeline import get_feed_querysets
 
 User = get_user_model()
 
+SHOPPING_LIST_STREAMS = {
+    'txt': stream_txt_from_queryset,
+    'csv': stream_csv_from_queryset,
+}
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для Рецептов."""
-    queryset = Recipe.objects.all()
-    filter_backends = [DjangoFilterBackend]
+    cache_models = (Recipe, Tag, Ingredient, User)
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ['pub_date', 'favorites_count', 'shopping_cart_count']
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = CustomPagination
+    cursor_ordering = ('pub_date', 'id')
+
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user
+        )
 
     def get_serializer_class(self):
         """POST, PATCH или PUT-запрос"""
@@ -40,31 +63,77 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=('post', 'delete'))
     def favorite(self, request, pk=None):
         recipe = get_object_or_404(Recipe, pk=pk)
-        in_favorite = recipe.in_favorite.filter(user=self.request.user)
         return create_or_delete_record(
             request=request,
-            record=in_favorite,
-            serializer_data=FavoritListSerializer(recipe).data,
-            params={'recipe': recipe},
+            model=Favorite,
+            serializer=FavoritListSerializer(recipe),
+            recipe=recipe,
         )
 
     @action(detail=True, methods=('post', 'delete'))
     def shopping_cart(self, request, pk=None):
         recipe = get_object_or_404(Recipe, pk=pk)
-        in_shopping_list = recipe.in_shopping_list.filter(
-            user=self.request.user
-        )
         return create_or_delete_record(
             request=request,
-            record=in_shopping_list,
-            serializer_data=FavoritListSerializer(recipe).data,
-            params={'recipe': recipe},
+            model=ShoppingCart,
+            serializer=FavoritListSerializer(recipe),
+            recipe=recipe,
+        )
+
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми."""
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(
+            get_feed_querysets(self.get_queryset(), request.user),
+            request, view=self,
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def batch(self, request, model):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return create_or_delete_records(
+            request=request,
+            model=model,
+            targets=Recipe.objects.all(),
+            ids=serializer.validated_data['ids'],
         )
 
     @action(
-        detail=False, methods=('get',), permission_classes=(IsAuthenticated,)
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='batch/favorite',
+        permission_classes=(IsAuthenticated,),
     )
-    def download_shopping_cart(self, request):
+    def favorite_batch(self, request):
+        """Добавление или удаление нескольких рецептов в избранном."""
+        return self.batch(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='batch/shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        """Добавление или удаление нескольких рецептов в списке покупок."""
+        return self.batch(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PDFRenderer, PlainTextRenderer, CSVRenderer),
+        content_negotiation_class=FallbackContentNegotiation,
+    )
+    def download_shopping_cart(self, request, format=None):
+        """Список покупок в pdf, txt или csv (?format= или Accept)."""
         user = self.request.user
         recipes = user.shopping_list.values('recipe__id')
 
@@ -75,23 +144,57 @@ class RecipeViewSet(viewsets.ModelViewSet):
             .order_by('ingredient__name')
         )
 
-        pdf_file = create_pdf_from_queryset(buy_list, user.username)
+        renderer = request.accepted_renderer
+        if renderer.format in SHOPPING_LIST_STREAMS:
+            response = StreamingHttpResponse(
+                SHOPPING_LIST_STREAMS[renderer.format](buy_list),
+                content_type=f'{renderer.media_type}; '
+                             f'charset={renderer.charset}',
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="buy_list.{renderer.format}"'
+            )
+            return response
+
+        pdf_file = get_cached_pdf_from_queryset(buy_list, user.username)
         return FileResponse(
             pdf_file, as_attachment=True, filename='buy_list.pdf'
         )
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(VersionedETagMixin, viewsets.ModelViewSet):
     """Вьюсет для Тега."""
+    etag_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(VersionedETagMixin, viewsets.ModelViewSet):
     """Вьюсет для Ингредиентов."""
+    etag_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter]
     search_fields = ['^name']
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по ?name= обслуживает индекс в памяти процесса."""
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
+
+def metrics_view(request):
+    """Метрики запросов процесса в текстовом формате Prometheus.
+
+    Доступны администраторам и по METRICS_TOKEN; остальным — 404, чтобы
+    не выдавать сам адрес.
+    """
+    if not metrics.can_read_metrics(request):
+        raise Http404
+    return HttpResponse(
+        metrics.registry.render(), content_type=metrics.CONTENT_TYPE
+    )
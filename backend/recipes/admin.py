@@ -1,8 +1,8 @@
 from django.contrib import admin
 
 from api.utils import get_end_letter
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.models import (Favorite, ImageTask, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, StoredImage, Tag)
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -13,17 +13,16 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'author', 'image', 'text']
+    list_display = ['id', 'name', 'author', 'image', 'image_status', 'text']
     search_fields = ['name', 'author__username']
     list_filter = ['tags']
     inlines = [RecipeIngredientInline]
     readonly_fields = ('in_favorite',)
 
     def in_favorite(self, obj):
-        label = obj.in_favorite.count()
+        label = obj.favorites_count
         end_letter = get_end_letter(label)
         return f'всего рецепт добавлен в избранное  {label} раз{end_letter}'
-        
 
 
 @admin.register(Ingredient)
@@ -49,3 +48,15 @@ class ShoppingListAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['id', 'recipe', 'user']
     search_filter = ['user__username', 'user__email']
+
+
+@admin.register(ImageTask)
+class ImageTaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'recipe', 'source', 'attempts', 'created']
+    readonly_fields = ['error']
+
+
+@admin.register(StoredImage)
+class StoredImageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'image', 'references']
+    readonly_fields = ['content_hash', 'image', 'renditions', 'references']
@@ -0,0 +1,71 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart, StoredImage
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+# Ссылки меняются при смене изображения рецепта, а не при создании строк,
+# поэтому их сдвигает recipes.images, а не сигналы.
+REFERENCE_COUNTERS = (
+    (StoredImage, 'references', Recipe, 'stored_image'),
+)
+RECORD_COUNTERS = {
+    related_model: (model, field, related_field)
+    for model, field, related_model, related_field in COUNTERS
+}
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно сдвигает счётчик одной строки выражением F()."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Сдвигает счётчик сразу у нескольких строк одним UPDATE."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def change_record_counter(record, delta):
+    """Сдвигает счётчик, который ведётся по строкам модели record."""
+    model, field, related_field = RECORD_COUNTERS[type(record)]
+    target_id = getattr(
+        record, record._meta.get_field(related_field).attname
+    )
+    change_counter(model, target_id, field, delta)
+
+
+def change_record_counters(record_model, target_ids, delta):
+    """Сдвигает счётчики целей для пачки записей record_model."""
+    model, field, _ = RECORD_COUNTERS[record_model]
+    change_counters(model, target_ids, field, delta)
+
+
+def get_count_subquery(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        Value(0),
+    )
+
+
+def recount_counters():
+    """Пересчитывает все денормализованные счётчики по исходным таблицам."""
+    for model, field, related_model, related_field in (
+        COUNTERS + REFERENCE_COUNTERS
+    ):
+        yield model, field, model.objects.update(**{
+            field: get_count_subquery(related_model, related_field)
+        })
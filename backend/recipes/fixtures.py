@@ -0,0 +1,225 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.counters import recount_counters
+from recipes.images import store_image
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from recipes.timeline import fill_timelines
+from recipes.versions import bump_model_version_on_commit
+from users.models import Follow, User
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+WORDS = (
+    'суп', 'борщ', 'салат', 'пирог', 'каша', 'омлет', 'рагу', 'плов',
+    'запеканка', 'котлеты', 'паста', 'блины', 'сырники', 'курица', 'рыба',
+    'говядина', 'грибы', 'картофель', 'томаты', 'сыр', 'яблоки', 'тыква',
+    'быстрый', 'домашний', 'острый', 'сливочный', 'летний', 'постный',
+)
+SYNTHETIC_INGREDIENTS = 2000
+# Показатель степенного распределения популярности (закон Ципфа).
+ZIPF_EXPONENT = 1.1
+# Параметр Парето для числа избранного, подписок и покупок у пользователя.
+ACTIVITY_ALPHA = 1.5
+FAVORITES_PER_USER = (1, 200)
+FOLLOWS_PER_USER = (1, 100)
+CARTS_PER_USER = (1, 20)
+INGREDIENTS_PER_RECIPE = (2, 10)
+PUB_DATE_SPAN = timedelta(days=365)
+BATCH_SIZE = 5000
+
+
+class PowerLawSampler:
+    """Выбор id с вероятностью, убывающей как 1 / rank ** exponent.
+
+    Ранги перемешиваются один раз, кумулятивные веса считаются заранее,
+    поэтому каждый выбор — двоичный поиск по списку в памяти.
+    """
+
+    def __init__(self, rng, ids, exponent=ZIPF_EXPONENT):
+        self.rng = rng
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.ids) + 1)
+        ))
+
+    def choice(self):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights)[0]
+
+    def sample(self, count, exclude=None):
+        """До count разных id, не считая exclude."""
+        count = min(count, len(self.ids) - (exclude is not None))
+        chosen = set()
+        while len(chosen) < count:
+            for pk in self.rng.choices(
+                self.ids, cum_weights=self.cum_weights, k=count - len(chosen)
+            ):
+                if pk != exclude:
+                    chosen.add(pk)
+        return chosen
+
+
+def heavy_tailed(rng, limits):
+    """Целое из [minimum, maximum] с тяжёлым хвостом Парето."""
+    minimum, maximum = limits
+    return min(maximum, int(minimum * rng.paretovariate(ACTIVITY_ALPHA)))
+
+
+def bulk_insert(model, objects, batch_size=BATCH_SIZE):
+    """bulk_create пачками, не собирая весь поток объектов в памяти."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+@contextmanager
+def explicit_pub_date():
+    """Позволяет записать заданное pub_date вместо auto_now_add."""
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+@transaction.atomic
+def generate_dataset(
+    users_count, recipes_count, seed=0, prefix='plan', batch_size=BATCH_SIZE,
+    progress=None,
+):
+    """Детерминированный набор данных для нагрузочных проверок.
+
+    Авторы, рецепты и подписки выбираются по степенному закону: немногие
+    авторы и рецепты собирают большую часть подписок, избранного и
+    покупок. Все id выбираются в памяти, строки пишутся пачками.
+    Возвращает первого созданного пользователя и три тега.
+    """
+    rng = random.Random(seed)
+    report = progress or (lambda stage: None)
+
+    bulk_insert(User, (
+        User(
+            username=f'{prefix}_{num}',
+            email=f'{prefix}_{num}@example.com',
+            first_name=prefix.capitalize(),
+            last_name=str(num),
+            password='!',
+        )
+        for num in range(users_count)
+    ), batch_size)
+    users = User.objects.filter(username__startswith=f'{prefix}_')
+    user_ids = list(users.order_by('id').values_list('id', flat=True))
+    report('пользователи')
+
+    tags = [
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )[0]
+        for name, color, slug in TAGS
+    ]
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    if len(ingredient_ids) < INGREDIENTS_PER_RECIPE[1]:
+        bulk_insert(Ingredient, (
+            Ingredient(name=f'{prefix} {num}', measurement_unit='г')
+            for num in range(SYNTHETIC_INGREDIENTS)
+        ), batch_size)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    ingredients = PowerLawSampler(rng, ingredient_ids)
+    image = store_image(SMALL_GIF)
+
+    authors = PowerLawSampler(rng, user_ids)
+    now = timezone.now()
+    with explicit_pub_date():
+        bulk_insert(Recipe, (
+            Recipe(
+                author_id=authors.choice(),
+                name=' '.join(rng.sample(WORDS, 2)).capitalize(),
+                text=' '.join(rng.choices(WORDS, k=12)),
+                cooking_time=rng.randint(5, 180),
+                image=image.image,
+                image_renditions=image.renditions,
+                stored_image=image,
+                pub_date=now - PUB_DATE_SPAN * rng.random(),
+            )
+            for _ in range(recipes_count)
+        ), batch_size)
+    recipe_ids = list(Recipe.objects.filter(
+        author__in=users
+    ).order_by('id').values_list('id', flat=True))
+    report('рецепты')
+
+    bulk_insert(RecipeTag, (
+        RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(
+            [tag.id for tag in tags], rng.randint(1, len(tags))
+        )
+    ), batch_size)
+    bulk_insert(RecipeIngredient, (
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in ingredients.sample(
+            rng.randint(*INGREDIENTS_PER_RECIPE)
+        )
+    ), batch_size)
+    report('теги и ингредиенты рецептов')
+
+    if recipe_ids:
+        recipes = PowerLawSampler(rng, recipe_ids)
+        for model, limits, stage in (
+            (Favorite, FAVORITES_PER_USER, 'избранное'),
+            (ShoppingCart, CARTS_PER_USER, 'списки покупок'),
+        ):
+            bulk_insert(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in recipes.sample(heavy_tailed(rng, limits))
+            ), batch_size)
+            report(stage)
+    bulk_insert(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in authors.sample(
+            heavy_tailed(rng, FOLLOWS_PER_USER), exclude=user_id
+        )
+    ), batch_size)
+    report('подписки')
+
+    for _ in recount_counters():
+        pass
+    report('счётчики')
+    fill_timelines(users)
+    report('ленты')
+    # bulk_create не отправляет post_save: кеши, ETag и индекс
+    # ингредиентов работающих процессов сбрасываются здесь.
+    for model in (Ingredient, Recipe, User):
+        bump_model_version_on_commit(model)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return User.objects.get(pk=user_ids[0]), tags
@@ -0,0 +1,298 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from PIL import Image, ImageOps
+
+from recipes.counters import change_counter
+from recipes.models import ImageTask, Recipe, StoredImage
+from recipes.versions import bump_model_version_on_commit
+
+IMAGE_MAX_SIZE = (1280, 1280)
+IMAGE_TASK_MAX_ATTEMPTS = 3
+JPEG_QUALITY = 85
+IMAGES_PATH = Recipe._meta.get_field('image').upload_to
+RENDITIONS_PATH = 'recipes/renditions'
+# Имя: (размер, обрезать ли до точного размера).
+RENDITIONS = {
+    'thumbnail': ((160, 160), True),
+    'card': ((640, 426), True),
+    'full': (IMAGE_MAX_SIZE, False),
+}
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {
+        'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True,
+    }),
+}
+
+storage = Recipe._meta.get_field('image').storage
+
+
+def enqueue_image_processing(recipe):
+    """Ставит только что сохранённый исходник изображения в очередь."""
+    recipe.image_status = Recipe.IMAGE_PROCESSING
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_status=Recipe.IMAGE_PROCESSING
+    )
+    ImageTask.objects.create(recipe=recipe, source=recipe.image.name)
+
+
+def load_image(file):
+    """Проверяет файл и открывает его с учётом EXIF-ориентации."""
+    with Image.open(file) as image:
+        image.verify()
+    file.seek(0)
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def flatten(image):
+    """RGB-копия изображения; прозрачные области заливаются белым."""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode_image(image):
+    """Уменьшенное изображение в PNG (с прозрачностью) или JPEG."""
+    image = image.copy()
+    image.thumbnail(IMAGE_MAX_SIZE)
+    buffer = BytesIO()
+    if image.mode == 'RGBA':
+        image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    image.save(
+        buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True
+    )
+    return buffer.getvalue(), 'jpg'
+
+
+def save_content(name, content):
+    """Пишет файл по адресу содержимого, только если его ещё нет."""
+    if storage.exists(name):
+        return name
+    return storage.save(name, ContentFile(content))
+
+
+def save_renditions(image, content_hash):
+    """Сохраняет все версии изображения; возвращает их пути по размерам."""
+    renditions = {}
+    for name, (size, crop) in RENDITIONS.items():
+        if crop:
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+        renditions[name] = {}
+        for extension, (image_format, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            if image_format == 'JPEG':
+                flatten(resized).save(buffer, image_format, **options)
+            else:
+                resized.save(buffer, image_format, **options)
+            renditions[name][extension] = save_content(
+                f'{RENDITIONS_PATH}/{content_hash}/{name}.{extension}',
+                buffer.getvalue(),
+            )
+    return renditions
+
+
+def delete_renditions(renditions):
+    for formats in renditions.values():
+        for path in formats.values():
+            storage.delete(path)
+
+
+def get_content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def find_stored_image(content):
+    """Уже сохранённое изображение с теми же байтами исходника или None.
+
+    Строка блокируется до конца транзакции, чтобы сборщик мусора не
+    удалил файл, пока к нему прикрепляется рецепт.
+    """
+    return StoredImage.objects.select_for_update().filter(
+        content_hash=get_content_hash(content)
+    ).first()
+
+
+@transaction.atomic
+def store_image(content):
+    """Находит по хешу или обрабатывает и сохраняет исходник изображения.
+
+    Повторная загрузка тех же байтов не декодирует и не пишет ничего,
+    кроме одной строки поиска по уникальному хешу.
+    """
+    content_hash = get_content_hash(content)
+    stored = StoredImage.objects.select_for_update().filter(
+        content_hash=content_hash
+    ).first()
+    if stored is not None:
+        return stored
+    image = load_image(BytesIO(content))
+    processed, extension = encode_image(image)
+    name = save_content(f'{IMAGES_PATH}/{content_hash}.{extension}', processed)
+    renditions = save_renditions(image, content_hash)
+    try:
+        with transaction.atomic():
+            return StoredImage.objects.create(
+                content_hash=content_hash, image=name, renditions=renditions
+            )
+    except IntegrityError:
+        return StoredImage.objects.get(content_hash=content_hash)
+
+
+def attach_stored_image(recipe, stored):
+    """Переключает рецепт на stored и переносит ссылку со старого файла."""
+    old_id = recipe.stored_image_id
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image=stored.image,
+        image_renditions=stored.renditions,
+        image_status=Recipe.IMAGE_READY,
+        stored_image=stored,
+    )
+    recipe.image = stored.image
+    recipe.image_renditions = stored.renditions
+    recipe.image_status = Recipe.IMAGE_READY
+    recipe.stored_image = stored
+    bump_model_version_on_commit(Recipe)
+    change_counter(StoredImage, stored.pk, 'references', 1)
+    if old_id is not None:
+        release_stored_image(old_id)
+
+
+def release_stored_image(stored_id):
+    """Снимает ссылку; файл без ссылок удаляется после коммита."""
+    change_counter(StoredImage, stored_id, 'references', -1)
+    transaction.on_commit(lambda: collect_garbage([stored_id]))
+
+
+def collect_garbage(ids=None):
+    """Удаляет файлы изображений без ссылок; возвращает их количество.
+
+    Строки блокируются, а файлы удаляются до коммита: воркер, который
+    в это время ищет тот же хеш, дождётся коммита и запишет файл заново.
+    """
+    with transaction.atomic():
+        orphans = StoredImage.objects.select_for_update(
+            skip_locked=True
+        ).filter(references=0).exclude(
+            Exists(Recipe.objects.filter(stored_image=OuterRef('pk')))
+        )
+        if ids is not None:
+            orphans = orphans.filter(pk__in=ids)
+        orphans = list(orphans)
+        for stored in orphans:
+            storage.delete(stored.image)
+            delete_renditions(stored.renditions)
+        StoredImage.objects.filter(
+            pk__in=[stored.pk for stored in orphans]
+        ).delete()
+    return len(orphans)
+
+
+def discard_source(name):
+    """Удаляет исходник после коммита, если на него не ссылаются рецепты."""
+    if not Recipe.objects.filter(image=name).exists():
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def process_image_task(task):
+    """Обрабатывает одну задачу; вызывается внутри транзакции."""
+    recipe = task.recipe
+    if recipe.image.name != task.source:
+        # Изображение успели заменить: новый исходник обработает новая
+        # задача, а этот больше не нужен.
+        task.delete()
+        discard_source(task.source)
+        return
+    try:
+        with storage.open(task.source) as raw:
+            content = raw.read()
+        stored = store_image(content)
+    except Exception as error:
+        task.attempts += 1
+        task.error = repr(error)
+        if task.attempts < IMAGE_TASK_MAX_ATTEMPTS:
+            task.save(update_fields=['attempts', 'error'])
+            return
+        # Исходник проверен только по сигнатуре: отдавать его нельзя.
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image='', image_status=Recipe.IMAGE_FAILED
+        )
+        bump_model_version_on_commit(Recipe)
+        task.delete()
+        discard_source(task.source)
+        return
+
+    attach_stored_image(recipe, stored)
+    task.delete()
+    transaction.on_commit(lambda: storage.delete(task.source))
+
+
+def process_pending_images(limit):
+    """Забирает из очереди до limit задач; возвращает число обработанных.
+
+    Каждая задача блокируется в своей транзакции с SKIP LOCKED, поэтому
+    несколько воркеров не обрабатывают одно изображение дважды.
+    """
+    processed = 0
+    while processed < limit:
+        with transaction.atomic():
+            task = (
+                ImageTask.objects.select_for_update(
+                    skip_locked=True, of=('self',)
+                )
+                .select_related('recipe')
+                .first()
+            )
+            if task is None:
+                break
+            process_image_task(task)
+        processed += 1
+    return processed
+
+
+def adopt_recipe_image(recipe):
+    """Переводит ранее загруженное изображение рецепта в хранилище по хешу.
+
+    Возвращает False, если изображение заменили во время обработки.
+    """
+    legacy_name = recipe.image.name
+    with storage.open(legacy_name) as file:
+        content = file.read()
+    with transaction.atomic():
+        stored = store_image(content)
+        if not Recipe.objects.select_for_update().filter(
+            pk=recipe.pk, image=legacy_name, stored_image__isnull=True
+        ).exists():
+            return False
+        attach_stored_image(recipe, stored)
+        if legacy_name != stored.image and not Recipe.objects.filter(
+            image=legacy_name
+        ).exists():
+            transaction.on_commit(lambda: storage.delete(legacy_name))
+    return True
+
+
+def rebuild_renditions(stored):
+    """Пересоздаёт версии сохранённого изображения."""
+    with storage.open(stored.image) as file:
+        image = load_image(file)
+    delete_renditions(stored.renditions)
+    renditions = save_renditions(image, stored.content_hash)
+    StoredImage.objects.filter(pk=stored.pk).update(renditions=renditions)
+    Recipe.objects.filter(stored_image=stored).update(
+        image_renditions=renditions
+    )
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.versions import bump_model_version
+
+IMPORT_BATCH_SIZE = 10000
+JSON_CHUNK_SIZE = 64 * 1024
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def read_csv(file):
+    """Строки name,measurement_unit из CSV без заголовка."""
+    for row in csv.reader(file):
+        yield tuple(row[:2]) if len(row) >= 2 else None
+
+
+def read_json(file):
+    """Объекты массива JSON по одному, без загрузки файла целиком.
+
+    Подходит и для JSON Lines: объекты могут разделяться переводом строки.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if not buffer:
+            if eof:
+                return
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+    '.jsonl': read_json,
+}
+
+
+def read_rows(path):
+    """Поток (name, measurement_unit) из файла; формат — по расширению."""
+    reader = READERS[Path(path).suffix.lower()]
+    with open(path, encoding='utf-8', newline='') as file:
+        yield from reader(file)
+
+
+def clean_row(row):
+    if row is None:
+        return None
+    name, measurement_unit = row
+    if not isinstance(name, str) or not isinstance(measurement_unit, str):
+        return None
+    name, measurement_unit = name.strip(), measurement_unit.strip()
+    if (
+        not name or not measurement_unit
+        or len(name) > NAME_MAX_LENGTH
+        or len(measurement_unit) > UNIT_MAX_LENGTH
+    ):
+        return None
+    return name, measurement_unit
+
+
+def insert_batch(rows):
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in rows
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def copy_batch(rows):
+    """COPY пачки во временную таблицу и INSERT ... ON CONFLICT DO NOTHING."""
+    table = Ingredient._meta.db_table
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS ingredient_import '
+            '(name text, measurement_unit text) ON COMMIT DELETE ROWS'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+        cursor.execute('TRUNCATE ingredient_import')
+
+
+def import_ingredients(rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Загружает поток строк пачками по batch_size, пропуская дубликаты.
+
+    Каждая пачка пишется в своей транзакции; память не зависит от размера
+    файла. progress(read, skipped, elapsed) вызывается после каждой пачки.
+    Возвращает (прочитано, пропущено некорректных, добавлено).
+    """
+    write_batch = (
+        copy_batch if connection.vendor == 'postgresql' else insert_batch
+    )
+    before = Ingredient.objects.count()
+    start = time.perf_counter()
+    read = skipped = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        read += len(batch)
+        cleaned = [row for row in map(clean_row, batch) if row is not None]
+        skipped += len(batch) - len(cleaned)
+        with transaction.atomic():
+            write_batch(list(dict.fromkeys(cleaned)))
+        if progress is not None:
+            progress(read, skipped, time.perf_counter() - start)
+    bump_model_version(Ingredient)
+    return read, skipped, Ingredient.objects.count() - before
@@ -0,0 +1,437 @@
+import base64
+import gc
+import json
+import math
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+from itertools import combinations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.metrics import RequestStats
+from recipes.fixtures import generate_dataset
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+BUDGETS_PATH = settings.BASE_DIR / 'benchmark_budgets.json'
+# Запас при записи бюджетов к измеренному p99. Маршрутам быстрее
+# миллисекунды добавляется ещё и постоянный запас на шум планировщика.
+LATENCY_HEADROOM = 1.5
+LATENCY_SLACK_MS = 1
+MEMORY_HEADROOM = 1.5
+DEFAULT_DATASET = {'users': 300, 'recipes': 5000, 'seed': 0}
+# Свой кеш: общий не получит ответов с откаченными данными, а этот можно
+# очищать перед каждым прогоном.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'endpoint_benchmark',
+    },
+}
+# Загрузки пишутся во временный каталог: откат транзакции их не удаляет.
+BENCHMARK_MEDIA_PREFIX = 'endpoint_benchmark_media_'
+# Без ?limit списки не разбиваются на страницы; фронтенд просит по 6.
+PAGE = {'limit': 6, 'page': 1}
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def make_image_data(size=(640, 480)):
+    """Изображение в base64, которого ещё нет в хранилище по хешу."""
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def created_recipe_path(response):
+    return f'/api/recipes/{response.json()["id"]}/'
+
+
+def consume(response):
+    """Читает тело ответа целиком, в том числе потокового."""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class Command(BaseCommand):
+    help = (
+        'p50/p99, число SQL-запросов и память каждого маршрута API '
+        'на сгенерированных данных; падает при превышении бюджетов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=100,
+            help=(
+                'Запросов к каждому маршруту; при меньшем числе p99 '
+                'совпадает с максимумом'
+            ),
+        )
+        parser.add_argument('--budgets', default=str(BUDGETS_PATH))
+        parser.add_argument(
+            '--update-budgets', action='store_true',
+            help='Записать бюджеты по результатам этого запуска',
+        )
+        parser.add_argument(
+            '--users', type=int,
+            help='По умолчанию — размер данных из файла бюджетов',
+        )
+        parser.add_argument('--recipes', type=int)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument(
+            '--route', action='append', default=[],
+            help='Запускать только маршруты с этой подстрокой в имени',
+        )
+
+    @staticmethod
+    def load_budgets(path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'dataset': DEFAULT_DATASET, 'routes': {}}
+
+    @staticmethod
+    def get_routes(user, tags):
+        """Маршруты (имя, метод, путь, параметры, авторизован ли клиент).
+
+        Парные POST и DELETE идут подряд, чтобы каждый прогон начинался
+        с тех же данных. Повтор анонимного запроса отвечает из кеша.
+        Путь может быть функцией от ответа предыдущего маршрута: так
+        изменение и удаление получают рецепт, созданный перед ними.
+        """
+        recipe = user.favorites.first().recipe
+        other_recipe = Recipe.objects.exclude(
+            in_favorited__user=user
+        ).exclude(in_shopping_cart__user=user).order_by('id').first()
+        author = User.objects.exclude(pk=user.pk).exclude(
+            following__user=user
+        ).order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        batch_recipes = {'ids': list(Recipe.objects.exclude(
+            in_favorited__user=user
+        ).exclude(in_shopping_cart__user=user).exclude(
+            pk=other_recipe.pk
+        ).order_by('id').values_list('id', flat=True)[:PAGE['limit']])}
+        batch_authors = {'ids': list(User.objects.exclude(
+            pk__in=(user.pk, author.pk)
+        ).exclude(following__user=user).order_by('id').values_list(
+            'id', flat=True
+        )[:PAGE['limit']])}
+        filters = {
+            'tags': [tags[0].slug, tags[1].slug],
+            'author': recipe.author_id,
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+            'search': recipe.name.split()[0],
+        }
+        routes = [
+            ('recipes anonymous', 'get', '/api/recipes/', PAGE, False),
+            (
+                'recipes anonymous cached', 'get', '/api/recipes/', PAGE,
+                False,
+            ),
+            ('recipes', 'get', '/api/recipes/', PAGE, True),
+        ]
+        for size in range(1, len(filters) + 1):
+            for names in combinations(filters, size):
+                routes.append((
+                    f'recipes ?{"&".join(names)}', 'get', '/api/recipes/',
+                    {**PAGE, **{name: filters[name] for name in names}}, True,
+                ))
+        recipe_path = f'/api/recipes/{recipe.id}/'
+        other_path = f'/api/recipes/{other_recipe.id}/'
+        author_path = f'/api/users/{author.id}/'
+        routes += [
+            ('recipe detail', 'get', recipe_path, {}, True),
+            ('recipe detail anonymous', 'get', recipe_path, {}, False),
+            (
+                'recipe detail anonymous cached', 'get', recipe_path, {},
+                False,
+            ),
+            ('feed', 'get', '/api/recipes/feed/', PAGE, True),
+            ('favorite add', 'post', f'{other_path}favorite/', {}, True),
+            ('favorite remove', 'delete', f'{other_path}favorite/', {}, True),
+            ('cart add', 'post', f'{other_path}shopping_cart/', {}, True),
+            (
+                'cart remove', 'delete', f'{other_path}shopping_cart/', {},
+                True,
+            ),
+        ]
+        for name in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/batch/{name}/'
+            routes += [
+                (f'batch {name} add', 'post', path, batch_recipes, True),
+                (f'batch {name} remove', 'delete', path, batch_recipes, True),
+            ]
+        for renderer in ('txt', 'csv', 'pdf'):
+            routes.append((
+                f'download_shopping_cart {renderer}', 'get',
+                '/api/recipes/download_shopping_cart/',
+                {'format': renderer}, True,
+            ))
+        recipe_data = {
+            'name': 'Рецепт для замера',
+            'text': 'Описание рецепта для замера',
+            'cooking_time': 30,
+            'tags': [tag.id for tag in tags[:2]],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': amount}
+                for amount, ingredient_id in enumerate(
+                    Ingredient.objects.order_by('id').values_list(
+                        'id', flat=True
+                    )[:5],
+                    start=10,
+                )
+            ],
+            'image': make_image_data(),
+        }
+        recipe_changes = {
+            'name': 'Изменённый рецепт',
+            'tags': [tag.id for tag in tags[1:]],
+            'ingredients': recipe_data['ingredients'][1:] + [
+                {'id': ingredient.id, 'amount': 1}
+            ],
+        }
+        routes += [
+            ('recipe create', 'post', '/api/recipes/', recipe_data, True),
+            (
+                'recipe update', 'patch', created_recipe_path,
+                recipe_changes, True,
+            ),
+            ('recipe delete', 'delete', created_recipe_path, {}, True),
+        ]
+        routes += [
+            ('tags', 'get', '/api/tags/', {}, False),
+            ('ingredients', 'get', '/api/ingredients/', {}, False),
+            (
+                'ingredient search', 'get', '/api/ingredients/',
+                {'name': ingredient.name[:3]}, False,
+            ),
+            ('users', 'get', '/api/users/', PAGE, True),
+            ('user detail', 'get', author_path, {}, True),
+            ('users me', 'get', '/api/users/me/', {}, True),
+            (
+                'subscriptions', 'get', '/api/users/subscriptions/',
+                {**PAGE, 'recipes_limit': 3}, True,
+            ),
+            ('subscribe', 'post', f'{author_path}subscribe/', {}, True),
+            ('unsubscribe', 'delete', f'{author_path}subscribe/', {}, True),
+            (
+                'batch subscribe', 'post', '/api/users/batch/subscribe/',
+                batch_authors, True,
+            ),
+            (
+                'batch unsubscribe', 'delete', '/api/users/batch/subscribe/',
+                batch_authors, True,
+            ),
+        ]
+        return routes
+
+    @staticmethod
+    def request(client, method, path, params):
+        """Время в секундах, число SQL-запросов и ответ."""
+        # Тело POST и DELETE уходит в JSON, как его шлёт фронтенд.
+        kwargs = {} if method == 'get' else {'format': 'json'}
+        stats = RequestStats()
+        with connection.execute_wrapper(stats.record_query):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, params, **kwargs)
+            consume(response)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code} '
+                f'{consume(response)[:200]!r}'
+            )
+        return elapsed, stats.queries, response
+
+    def measure(self, routes, clients, repeat):
+        """Прогоны по всем маршрутам; первый прогон — прогрев.
+
+        Память меряется отдельным прогоном под tracemalloc, чтобы
+        трассировка не искажала время. Каждый прогон начинается с пустого
+        кеша, иначе ответы из него истекают в случайный момент. Сборщик
+        мусора на время прогона выключается и запускается между
+        прогонами: иначе его паузы случайно попадают в p99 маршрутов.
+        """
+        results = {
+            name: {'latencies': [], 'queries': 0, 'memory': 0}
+            for name, *_ in routes
+        }
+        for run in range(repeat + 1):
+            cache.clear()
+            gc.collect()
+            gc.disable()
+            try:
+                response = None
+                for name, method, path, params, authenticated in routes:
+                    if callable(path):
+                        path = path(response)
+                    elapsed, queries, response = self.request(
+                        clients[authenticated], method, path, params
+                    )
+                    if run:
+                        result = results[name]
+                        result['latencies'].append(elapsed)
+                        result['queries'] = max(result['queries'], queries)
+            finally:
+                gc.enable()
+        cache.clear()
+        tracemalloc.start()
+        try:
+            response = None
+            for name, method, path, params, authenticated in routes:
+                if callable(path):
+                    path = path(response)
+                tracemalloc.clear_traces()
+                *_, response = self.request(
+                    clients[authenticated], method, path, params
+                )
+                results[name]['memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            name: {
+                'p50_ms': percentile(result['latencies'], 50) * 1e3,
+                'p99_ms': percentile(result['latencies'], 99) * 1e3,
+                'queries': result['queries'],
+                'memory_kb': result['memory'] / 1024,
+            }
+            for name, result in results.items()
+        }
+
+    @staticmethod
+    def find_violations(result, budget):
+        """Список превышений бюджета маршрута."""
+        if budget is None:
+            return ['нет бюджета']
+        return [
+            f'{key} {round(result[key], 1)} > {budget[key]}'
+            for key in ('p99_ms', 'queries', 'memory_kb')
+            if result[key] > budget[key]
+        ]
+
+    @staticmethod
+    def make_budget(result):
+        return {
+            'p99_ms': math.ceil(
+                result['p99_ms'] * LATENCY_HEADROOM + LATENCY_SLACK_MS
+            ),
+            'queries': result['queries'],
+            'memory_kb': math.ceil(result['memory_kb'] * MEMORY_HEADROOM),
+        }
+
+    @staticmethod
+    def select_routes(routes, parts):
+        """Маршруты с подстрокой из parts в имени.
+
+        Вместе с маршрутом выбирается и предыдущий, если путь — функция
+        от его ответа.
+        """
+        selected = [
+            not parts or any(part in route[0] for part in parts)
+            for route in routes
+        ]
+        for index in range(len(routes) - 1, 0, -1):
+            if selected[index] and callable(routes[index][2]):
+                selected[index - 1] = True
+        return [
+            route for route, chosen in zip(routes, selected) if chosen
+        ]
+
+    @transaction.atomic
+    def run_benchmark(self, dataset, parts, repeat):
+        """Замеры на сгенерированных данных; все записи откатываются."""
+        user, tags = generate_dataset(
+            dataset['users'], dataset['recipes'], dataset['seed'],
+            prefix='endpoint_benchmark',
+        )
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+        )
+        routes = self.select_routes(self.get_routes(user, tags), parts)
+        results = self.measure(routes, clients, repeat)
+        transaction.set_rollback(True)
+        return results
+
+    def handle(self, *args, **options):
+        budgets = self.load_budgets(options['budgets'])
+        dataset = {
+            key: value if options[key] is None else options[key]
+            for key, value in {**DEFAULT_DATASET, **budgets['dataset']}.items()
+        }
+        if dataset != budgets['dataset'] and not options['update_budgets']:
+            self.stdout.write(self.style.WARNING(
+                'Размер данных отличается от записанного в бюджетах'
+            ))
+        if Recipe.objects.exists():
+            # Бюджеты записаны на пустой базе: чужие данные меняют и
+            # планы запросов, и размер ответов.
+            self.stdout.write(self.style.WARNING(
+                'В базе уже есть рецепты, результаты несравнимы с бюджетами'
+            ))
+        media_root = tempfile.mkdtemp(prefix=BENCHMARK_MEDIA_PREFIX)
+        try:
+            with override_settings(
+                CACHES=BENCHMARK_CACHES, MEDIA_ROOT=media_root
+            ):
+                results = self.run_benchmark(
+                    dataset, options['route'], options['repeat']
+                )
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        failures = []
+        for name, result in results.items():
+            errors = self.find_violations(result, budgets['routes'].get(name))
+            line = (
+                f'{name:60} p50 {result["p50_ms"]:8.2f} ms  '
+                f'p99 {result["p99_ms"]:8.2f} ms  '
+                f'{result["queries"]:3} запр.  '
+                f'{result["memory_kb"]:9.1f} КБ'
+            )
+            if errors and not options['update_budgets']:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{line}  {"; ".join(errors)}'
+                ))
+            else:
+                self.stdout.write(line)
+
+        if options['update_budgets']:
+            budgets['dataset'] = dataset
+            budgets['routes'].update(
+                (name, self.make_budget(result))
+                for name, result in results.items()
+            )
+            with open(options['budgets'], 'w', encoding='utf-8') as file:
+                json.dump(budgets, file, ensure_ascii=False, indent=2)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Бюджеты записаны в {options["budgets"]}'
+            ))
+        elif failures:
+            raise CommandError(
+                f'Превышены бюджеты маршрутов: {", ".join(failures)}'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены'))
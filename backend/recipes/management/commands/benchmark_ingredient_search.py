@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.ingredient_index import INGREDIENT_SEARCH_LIMIT, ingredient_index
+from recipes.importers import import_ingredients, read_rows
+from recipes.models import Ingredient
+from recipes.versions import bump_model_version
+
+PREFIXES = ('а', 'ба', 'мол', 'кар', 'сыр', 'я', 'zz')
+
+
+class Command(BaseCommand):
+    help = 'Сравнение поиска ингредиентов через ORM и индекс в памяти'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', type=str,
+            default=str(settings.BASE_DIR / 'data' / 'ingredients.csv'),
+            help='Путь к файлу',
+        )
+        parser.add_argument('--repeat', type=int, default=200)
+
+    @staticmethod
+    def measure(search, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for prefix in PREFIXES:
+                search(prefix)
+        return (time.perf_counter() - start) / (repeat * len(PREFIXES))
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            Ingredient.objects.all().delete()
+            import_ingredients(read_rows(options['path']))
+            total = Ingredient.objects.count()
+
+            orm = self.measure(
+                lambda prefix: list(Ingredient.objects.filter(
+                    name__istartswith=prefix
+                ).values('id', 'name', 'measurement_unit')),
+                options['repeat'],
+            )
+            orm_limited = self.measure(
+                lambda prefix: list(Ingredient.objects.filter(
+                    name__istartswith=prefix
+                ).values(
+                    'id', 'name', 'measurement_unit'
+                )[:INGREDIENT_SEARCH_LIMIT]),
+                options['repeat'],
+            )
+            start = time.perf_counter()
+            ingredient_index.search('')
+            build = time.perf_counter() - start
+            index = self.measure(ingredient_index.search, options['repeat'])
+            transaction.set_rollback(True)
+        bump_model_version(Ingredient)
+
+        self.stdout.write(
+            f'{total} ингредиентов, префиксы: {", ".join(PREFIXES)}\n'
+            f'ORM:                {orm * 1e6:10.1f} us/запрос\n'
+            f'ORM c LIMIT:        {orm_limited * 1e6:10.1f} us/запрос\n'
+            f'Индекс (построение): {build * 1e3:9.1f} ms\n'
+            f'Индекс:             {index * 1e6:10.1f} us/запрос'
+        )
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from recipes.fixtures import generate_dataset
+from recipes.models import Recipe
+
+PAGE_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение RecipeFilter на EXISTS с фильтрацией через JOIN и '
+        'NOT IN для ?tags=a&tags=b&is_favorited=&author='
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    @staticmethod
+    def legacy_queryset(user, slugs, favorited, author):
+        """Прежний план: JOIN по tags__slug с DISTINCT и id IN/NOT IN."""
+        queryset = Recipe.objects.filter(
+            tags__slug__in=slugs, author=author
+        ).distinct()
+        recipes = user.favorites.values('recipe__id')
+        if favorited == '1':
+            return queryset.filter(id__in=recipes)
+        return queryset.exclude(id__in=recipes)
+
+    @staticmethod
+    def filter_queryset(user, slugs, favorited, author):
+        request = RequestFactory().get('/api/recipes/', {
+            'tags': slugs, 'is_favorited': favorited, 'author': author.id,
+        })
+        request.user = user
+        return RecipeFilter(
+            request.GET, queryset=Recipe.objects.all(), request=request
+        ).qs
+
+    @staticmethod
+    def measure(queryset, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.order_by('pub_date', 'id')[:PAGE_SIZE].values_list(
+                'id', flat=True
+            ))
+        return (time.perf_counter() - start) / repeat
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user, tags = generate_dataset(
+                options['users'], options['recipes'], options['seed']
+            )
+            author = user.favorites.first().recipe.author
+            slugs = [tags[0].slug, tags[1].slug]
+            for favorited in ('1', '0'):
+                legacy = self.measure(
+                    self.legacy_queryset(user, slugs, favorited, author),
+                    options['repeat'],
+                )
+                current = self.measure(
+                    self.filter_queryset(user, slugs, favorited, author),
+                    options['repeat'],
+                )
+                self.stdout.write(
+                    f'is_favorited={favorited}: JOIN/IN {legacy * 1e3:8.2f} '
+                    f'ms, EXISTS {current * 1e3:8.2f} ms'
+                )
+            transaction.set_rollback(True)
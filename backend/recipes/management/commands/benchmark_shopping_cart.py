@@ -0,0 +1,99 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.report import get_cached_pdf_from_queryset, get_pdf_cache_key
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from users.models import User
+
+INGREDIENTS_PER_RECIPE = 5
+
+
+class Command(BaseCommand):
+    help = 'Сравнение холодной и тёплой выгрузки списка покупок в PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Количество рецептов в корзине',
+        )
+
+    @staticmethod
+    def create_cart(size):
+        user = User.objects.create_user(
+            username=f'benchmark_{size}',
+            email=f'benchmark_{size}@example.com',
+            first_name='Benchmark',
+            last_name='Benchmark',
+            password='benchmark',
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark {size} {num}', measurement_unit='г')
+            for num in range(size * INGREDIENTS_PER_RECIPE)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=user,
+                name=f'Recipe # {num}',
+                text=f'Тестовый рецепт {num}',
+                cooking_time=1,
+                image='recipes/images/small.gif',
+            )
+            for num in range(size)
+        )
+        if not all(recipe.pk for recipe in recipes):
+            recipes = list(Recipe.objects.filter(author=user))
+            ingredients = list(Ingredient.objects.filter(
+                name__startswith=f'benchmark {size} '
+            ))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    num * INGREDIENTS_PER_RECIPE + offset
+                ],
+                amount=offset + 1,
+            )
+            for num, recipe in enumerate(recipes)
+            for offset in range(INGREDIENTS_PER_RECIPE)
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        return user
+
+    @staticmethod
+    def get_buy_list(user):
+        return (
+            RecipeIngredient.objects.filter(
+                recipe__in=user.shopping_list.values('recipe__id')
+            )
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(amount=Sum('amount'))
+            .order_by('ingredient__name')
+        )
+
+    def download(self, user):
+        start = time.perf_counter()
+        get_cached_pdf_from_queryset(self.get_buy_list(user), user.username)
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for size in options['sizes']:
+                user = self.create_cart(size)
+                cache.delete(get_pdf_cache_key(
+                    self.get_buy_list(user), user.username
+                ))
+                cold = self.download(user)
+                warm = self.download(user)
+                self.stdout.write(
+                    f'{size:>6} рецептов: cold {cold * 1000:9.1f} ms, '
+                    f'warm {warm * 1000:7.1f} ms'
+                )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark finished'))
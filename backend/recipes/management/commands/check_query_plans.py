@@ -0,0 +1,125 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from recipes.fixtures import generate_dataset
+from recipes.models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingCart, TimelineEntry)
+from recipes.timeline import follow_authors, get_feed_querysets
+from users.models import Follow, User
+
+HOT_TABLES = (
+    Recipe._meta.db_table,
+    RecipeTag._meta.db_table,
+    RecipeIngredient._meta.db_table,
+    Favorite._meta.db_table,
+    ShoppingCart._meta.db_table,
+    Follow._meta.db_table,
+    TimelineEntry._meta.db_table,
+)
+PAGE_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN горячих запросов на сгенерированных данных; '
+        'падает, если запрос сканирует большую таблицу целиком'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    @staticmethod
+    def filter_recipes(user, params):
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = user
+        return RecipeFilter(
+            request.GET,
+            queryset=Recipe.objects.with_user_flags(user),
+            request=request,
+        ).qs.order_by('pub_date', 'id')[:PAGE_SIZE]
+
+    def get_queries(self, user, tags):
+        author = user.follower.first().author
+        shopping_list = user.shopping_list.values('recipe__id')
+        follow_authors(
+            user.id, user.follower.values_list('author_id', flat=True)
+        )
+        feed, feed_on_read = get_feed_querysets(Recipe.objects.all(), user)
+        queries = {
+            'recipe list': self.filter_recipes(user, {}),
+            'recipe list by author': self.filter_recipes(
+                user, {'author': author.id}
+            ),
+            'recipe list by tags': self.filter_recipes(
+                user, {'tags': [tags[0].slug, tags[1].slug]}
+            ),
+            'recipe list is_favorited': self.filter_recipes(
+                user, {'is_favorited': '1'}
+            ),
+            'recipe list is_in_shopping_cart': self.filter_recipes(
+                user, {'is_in_shopping_cart': '1'}
+            ),
+            'download_shopping_cart': (
+                RecipeIngredient.objects.filter(recipe__in=shopping_list)
+                .values('ingredient__name', 'ingredient__measurement_unit')
+                .annotate(amount=Sum('amount'))
+                .order_by('ingredient__name')
+            ),
+            'subscriptions': User.objects.filter(
+                pk__in=user.follower.values('author__id')
+            )[:PAGE_SIZE],
+            'subscription recipes': Recipe.objects.filter(
+                author_id__in=user.follower.values('author_id')
+            ).order_by('author_id', '-pub_date'),
+            'feed': feed.order_by('-feed_date', '-feed_id')[:PAGE_SIZE],
+            'feed fanned out on read': feed_on_read.order_by(
+                '-feed_date', '-feed_id'
+            )[:PAGE_SIZE],
+        }
+        if connection.vendor == 'postgresql':
+            # Без GIN-индексов поиск по тексту возможен только перебором.
+            queries['recipe search'] = Recipe.objects.search(
+                'борщ'
+            )[:PAGE_SIZE]
+        return queries
+
+    @staticmethod
+    def find_full_scans(plan):
+        if connection.vendor == 'postgresql':
+            pattern = r'Seq Scan on ({})\b'
+        else:
+            pattern = r'SCAN (?:TABLE )?({})\b(?! USING)'
+        return sorted(set(re.findall(
+            pattern.format('|'.join(HOT_TABLES)), plan
+        )))
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            user, tags = generate_dataset(
+                options['users'], options['recipes'], options['seed']
+            )
+            for name, queryset in self.get_queries(user, tags).items():
+                plan = queryset.explain()
+                full_scans = self.find_full_scans(plan)
+                if full_scans:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: полное сканирование {", ".join(full_scans)}'
+                    ))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                f'Полное сканирование таблиц в запросах: {", ".join(failures)}'
+            )
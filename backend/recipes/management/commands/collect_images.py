@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Удаление файлов изображений, на которые не ссылаются рецепты'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено изображений: {collect_garbage()}'
+        ))
@@ -1,103 +1,54 @@
-import random
-import sys
+import time
 
-from django.core.files.uploadedfile import SimpleUploadedFile
-from django.core.management.base import BaseCommand
-from django.db import IntegrityError
+from django.core.management.base import BaseCommand, CommandError
 
-from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag, ShoppingCart,
-    Tag,
-)
-from users.models import Follow, User
-
-small_gif = (
-    b'\x47\x49\x46\x38\x39\x61\x01\x00'
-    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
-    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
-    b'\x00\x00\x01\x00\x01\x00\x00\x02'
-    b'\x02\x4c\x01\x00\x3b'
-)
+from recipes.fixtures import BATCH_SIZE, generate_dataset
+from users.models import User
 
 
 class Command(BaseCommand):
-    help = 'Создание тестовых данных'
-
-    @staticmethod
-    def get_random_user():
-        return User.objects.all()[random.randint(0, User.objects.count() - 1)]
+    help = (
+        'Создание тестовых данных: пользователи, рецепты, избранное, '
+        'подписки и списки покупок со степенным распределением'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Один и тот же seed даёт один и тот же набор данных',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Строк в одном INSERT',
+        )
+        parser.add_argument(
+            '--prefix', default='fixture',
+            help='Префикс имён создаваемых пользователей',
+        )
 
     def handle(self, *args, **options):
-
-        test_image = SimpleUploadedFile(
-            name='small.gif', content=small_gif, content_type='image/gif'
-        )
-        try:
-            user = User.objects.create_user(
-                username='HasNoName',
-                email='HasNoEmail@mail.com',
-                first_name='HasNoFirstName',
-                last_name='HasNoLastName',
-                password='HasNoPassword',
+        prefix = options['prefix']
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix}_ уже существуют'
             )
-            another_user = User.objects.create_user(
-                username='HasNoName1',
-                email='HasNoEmail1@mail.com',
-                first_name='HasNoFirstName1',
-                last_name='HasNoLastName1',
-                password='HasNoPassword',
-            )
-
-            Follow.objects.create(user=another_user, author=user)
-            Follow.objects.create(user=user, author=another_user)
-
-            if not Tag.objects.exists():
-                Tag.objects.create(
-                    name='Завтрак', color='#E26C2D', slug='breakfast'
-                )
-                Tag.objects.create(name='Обед', color='#E26C21', slug='lunch')
-                Tag.objects.create(name='Ужин', color='#E26C22', slug='dinner')
+        start = time.perf_counter()
 
-            for rec_num in range(24):
-                recipe = Recipe.objects.create(
-                    name=f'Recipe # {rec_num}',
-                    text=f'Тестовый рецепт {rec_num}',
-                    cooking_time=random.randint(1, 25),
-                    image=test_image,
-                    author=self.get_random_user(),
-                )
-                Favorite.objects.create(
-                    recipe=recipe, user=self.get_random_user()
-                )
-                ShoppingCart.objects.create(
-                    recipe=recipe, user=self.get_random_user()
-                )
-
-                for num in range(random.randint(1, 3)):
-                    RecipeTag.objects.create(
-                        recipe=recipe, tag=Tag.objects.all()[num]
-                    )
-                for num in range(random.randint(1, 5)):
-                    try:
-                        RecipeIngredient.objects.create(
-                            recipe=recipe,
-                            ingredient=Ingredient.objects.all()[
-                                random.randint(
-                                    0,
-                                    Ingredient.objects.count() - 1
-                                )
-                            ],
-                            amount=random.randint(1, 200),
-                        )
-                    except IntegrityError as error:
-                        self.stdout.write(
-                            self.style.ERROR(error),
-                        )
-
-        except Exception as error:
+        def report(stage):
             self.stdout.write(
-                self.style.ERROR(f'Error loading model {error}'),
+                f'{time.perf_counter() - start:8.1f} с  {stage}'
             )
-            sys.exit()
 
-        self.stdout.write(self.style.SUCCESS(' Foodgram Objects Created'))
+        generate_dataset(
+            options['users'],
+            options['recipes'],
+            options['seed'],
+            prefix=prefix,
+            batch_size=options['batch_size'],
+            progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS('Тестовые данные созданы'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import adopt_recipe_image, rebuild_renditions
+from recipes.models import Recipe, StoredImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Перевод загруженных ранее изображений в хранилище по хешу '
+        'и создание их версий'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать версии у всех сохранённых изображений',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(
+            image_status=Recipe.IMAGE_READY, stored_image__isnull=True
+        ).only('id', 'image', 'stored_image').order_by('id')
+        adopted = failed = 0
+        for recipe in recipes.iterator(chunk_size=100):
+            try:
+                if adopt_recipe_image(recipe):
+                    adopted += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error!r}')
+        self.stdout.write(f'Изображений переведено: {adopted}')
+
+        if options['force']:
+            rebuilt = 0
+            for stored in StoredImage.objects.order_by('id').iterator():
+                try:
+                    rebuild_renditions(stored)
+                    rebuilt += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{stored.image}: {error!r}')
+            self.stdout.write(f'Версии пересозданы: {rebuilt}')
+        self.stdout.write(self.style.SUCCESS(f'Ошибок: {failed}'))
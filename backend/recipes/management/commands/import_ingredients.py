@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importers import (IMPORT_BATCH_SIZE, READERS,
+                               import_ingredients, read_rows)
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт ингредиентов из CSV, JSON или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv, .json или .jsonl')
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Строк в одной пачке',
+        )
+
+    def report(self, read, skipped, elapsed):
+        self.stdout.write(
+            f'\r{read} строк, пропущено {skipped}, '
+            f'{read / max(elapsed, 1e-9):,.0f} строк/с',
+            ending='',
+        )
+        self.stdout.flush()
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not any(path.lower().endswith(suffix) for suffix in READERS):
+            raise CommandError(
+                f'Неизвестный формат файла, ожидается {", ".join(READERS)}'
+            )
+        try:
+            read, skipped, created = import_ingredients(
+                read_rows(path), options['batch_size'], self.report
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Ошибка импорта: {error}')
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, пропущено {skipped}, добавлено {created}'
+        ))
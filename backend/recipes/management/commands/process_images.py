@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновой обработки загруженных изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать текущую очередь и завершиться',
+        )
+        parser.add_argument('--batch', type=int, default=10)
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_images(options['batch'])
+            if processed:
+                self.stdout.write(f'Обработано изображений: {processed}')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
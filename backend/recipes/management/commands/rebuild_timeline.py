@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import TimelineEntry
+from recipes.timeline import fill_timelines
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Заполнение лент подписчиков по существующим подпискам'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        TimelineEntry.objects.all().delete()
+        fill_timelines(User.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, покупок, рецептов и подписчиков'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, updated in recount_counters():
+            self.stdout.write(
+                f'{model._meta.label}.{field}: {updated} строк пересчитано'
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
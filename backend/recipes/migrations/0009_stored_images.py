@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True, verbose_name='SHA-256 исходного файла')),
+                ('image', models.CharField(max_length=255, verbose_name='Файл изображения')),
+                ('renditions', models.JSONField(default=dict, verbose_name='Версии изображения')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число рецептов с изображением')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='stored_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='recipes', to='recipes.storedimage', verbose_name='Файл изображения'),
+        ),
+    ]
@@ -1,10 +1,35 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField,
+                                            TrigramSimilarity)
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import UniqueConstraint
+from django.db import connection, models
+from django.db.models import (Case, Exists, F, Func, OuterRef, Prefetch, Q,
+                              UniqueConstraint, Value, When)
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+
+
+def casefold(value):
+    return None if value is None else value.casefold()
+
+
+class Casefold(Func):
+    """Строка в нижнем регистре с учётом Unicode.
+
+    LOWER в SQLite меняет только ASCII, поэтому там вызывается функция
+    CASEFOLD, которую регистрирует recipes.signals.
+    """
+    function = 'LOWER'
+    output_field = models.TextField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, function='CASEFOLD', **extra_context
+        )
+
 
 class Ingredient(models.Model):
     """Модель ингредиента."""
@@ -51,8 +76,155 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов без N+1 при сериализации."""
+
+    def with_related(self):
+        """Автор одним JOIN, теги и ингредиенты с количеством — prefetch."""
+        return self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def search(self, text):
+        """Рецепты по тексту запроса, самые релевантные первыми.
+
+        На PostgreSQL — полнотекстовый поиск по search_vector (GIN) или
+        триграммное сходство названия (GIN pg_trgm) для опечаток;
+        на остальных СУБД — совпадение всех слов в названии или описании.
+        """
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(
+                text, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(
+                Q(search_vector=query) | Q(name__trigram_similar=text)
+            ).annotate(
+                search_rank=(
+                    SearchRank(F('search_vector'), query)
+                    + TrigramSimilarity('name', text)
+                ),
+            ).order_by('-search_rank', '-pub_date', '-id')
+
+        text = text.casefold()
+        condition = Q()
+        for word in text.split():
+            condition &= (
+                Q(search_name__contains=word) | Q(search_text__contains=word)
+            )
+        return self.alias(
+            search_name=Casefold('name'), search_text=Casefold('text'),
+        ).filter(condition).annotate(
+            search_rank=Case(
+                When(search_name__contains=text, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=models.FloatField(),
+            ),
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+    def in_feed_of(self, user, authors=None):
+        """Рецепты из ленты user с ключами сортировки feed_date и feed_id.
+
+        authors — подзапрос авторов, записи которых берутся из ленты, по
+        умолчанию все подписки. Записи ленты авторов, от которых
+        пользователь уже отписался, отбрасываются, даже если ещё не удалены.
+        """
+        if authors is None:
+            authors = user.follower.values('author')
+        return self.filter(
+            timeline_entries__user=user,
+            timeline_entries__author__in=authors,
+        ).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__recipe_id'),
+        )
+
+    def by_authors_as_feed(self, authors):
+        """Рецепты authors с теми же ключами сортировки, что и у ленты."""
+        return self.filter(author_id__in=authors).annotate(
+            feed_date=F('pub_date'), feed_id=F('id'),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги is_favorited и is_in_shopping_cart."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+
+class StoredImage(models.Model):
+    """Обработанное изображение, хранимое один раз по хешу исходника."""
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='SHA-256 исходного файла')
+    image = models.CharField(
+        max_length=255,
+        verbose_name='Файл изображения')
+    renditions = models.JSONField(
+        default=dict,
+        verbose_name='Версии изображения')
+    references = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число рецептов с изображением')
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return self.image
+
+
+class ModelVersion(models.Model):
+    """Версия данных модели для инвалидации кешей во всех процессах."""
+    label = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Модель')
+    version = models.BigIntegerField(
+        verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.label} {self.version}'
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PROCESSING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готово'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    )
+
     author = models.ForeignKey(
         User,
         related_name='recipes',
@@ -64,6 +236,25 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipes/images',
         verbose_name='Изображение')
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        editable=False,
+        verbose_name='Состояние изображения')
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Версии изображения')
+    stored_image = models.ForeignKey(
+        StoredImage,
+        related_name='recipes',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Файл изображения')
     text = models.TextField(
         verbose_name='Описание рецепта',
         help_text='Введите описание рецепта')
@@ -86,16 +277,111 @@ class Recipe(models.Model):
         ])
     pub_date = models.DateTimeField(verbose_name='Время публикации',
                                     auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Добавлений в избранное')
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Добавлений в список покупок')
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['favorites_count', 'id'],
+                name='recipe_favorites_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class ImageTask(models.Model):
+    """Задача фоновой обработки загруженного изображения рецепта."""
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='image_tasks',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт')
+    source = models.CharField(
+        max_length=255,
+        verbose_name='Исходный файл')
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попытки')
+    error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время постановки в очередь')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.source}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик')
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор рецепта')
+    pub_date = models.DateTimeField(
+        verbose_name='Время публикации рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='timeline_user_recipe_unique'
+        )]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'recipe'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.recipe_id}'
+
+
 class RecipeIngredient(models.Model):
     """Модель связи рецепта и ингредиента."""
     recipe = models.ForeignKey(
@@ -140,6 +426,11 @@ class RecipeTag(models.Model):
                 name='recipe_tag_unique'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.tag.name} {self.recipe.name}'
@@ -168,6 +459,11 @@ class ShoppingCart(models.Model):
                 name='user_shoppingcart_unique'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='shoppingcart_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe_id} {self.user_id}'
@@ -196,6 +492,11 @@ class Favorite(models.Model):
                 name='user_favorite_unique'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe_id} {self.user_id}'
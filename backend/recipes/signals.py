@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.counters import RECORD_COUNTERS, change_record_counter
+from recipes.images import release_stored_image, storage
+from recipes.models import Ingredient, Recipe, Tag, casefold
+from recipes.timeline import fan_out_recipe, follow_authors, unfollow_authors
+from recipes.versions import bump_model_version_on_commit
+from users.models import Follow, User
+
+# Записи модели из RECORD_COUNTERS добавлены (delta > 0) или удалены
+# пользователем user_id для целей target_ids; отправляется и там, где
+# записи пишутся в обход post_save и post_delete.
+records_changed = Signal()
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    """Функция CASEFOLD для регистронезависимого поиска на SQLite."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('CASEFOLD', 1, casefold)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Recipe)
+def versioned_data_changed(sender, **kwargs):
+    bump_model_version_on_commit(sender)
+
+
+@receiver((post_save, post_delete), sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    """Автор виден в рецептах; обновление last_login версию не сдвигает."""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_model_version_on_commit(sender)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Снимает ссылку на файл изображения; необработанный исходник удаляет."""
+    if instance.stored_image_id is not None:
+        release_stored_image(instance.stored_image_id)
+    if instance.image_status == Recipe.IMAGE_PROCESSING:
+        name = instance.image.name
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def send_records_changed(instance, delta):
+    _, _, related_field = RECORD_COUNTERS[type(instance)]
+    records_changed.send(
+        sender=type(instance),
+        user_id=getattr(instance, 'user_id', None),
+        target_ids=[getattr(
+            instance, instance._meta.get_field(related_field).attname
+        )],
+        delta=delta,
+    )
+
+
+def record_created(sender, instance, created, **kwargs):
+    if created:
+        change_record_counter(instance, 1)
+        send_records_changed(instance, 1)
+
+
+def record_deleted(sender, instance, **kwargs):
+    change_record_counter(instance, -1)
+    send_records_changed(instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(records_changed, sender=Follow)
+def follows_changed(sender, user_id, target_ids, delta, **kwargs):
+    """Лента подписчика следует за его подписками."""
+    if delta > 0:
+        follow_authors(user_id, target_ids)
+    else:
+        unfollow_authors(user_id, target_ids)
+
+
+for record_model in RECORD_COUNTERS:
+    post_save.connect(record_created, sender=record_model)
+    post_delete.connect(record_deleted, sender=record_model)
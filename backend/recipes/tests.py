@@ -0,0 +1,211 @@
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from api.ingredient_index import ingredient_index
+from recipes import importers, timeline
+from recipes.fixtures import SMALL_GIF, generate_dataset
+from recipes.images import (IMAGE_TASK_MAX_ATTEMPTS, enqueue_image_processing,
+                            process_pending_images, storage)
+from recipes.models import (ImageTask, Ingredient, Recipe, StoredImage,
+                            TimelineEntry)
+from recipes.versions import get_model_versions
+from users.models import Follow, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediaTestCase(TestCase):
+    """Файлы тестов пишутся во временный каталог."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def create_user(name, **fields):
+    return User.objects.create(
+        username=name, email=f'{name}@example.com', **fields
+    )
+
+
+def create_recipe(author, name='recipe', **fields):
+    return Recipe.objects.create(
+        author=author, name=name, image='recipes/images/recipe.png',
+        text='text', cooking_time=10, **fields
+    )
+
+
+class GenerateDatasetTest(MediaTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bumps_versions(self):
+        models = (Ingredient, Recipe, User)
+        before = get_model_versions(*models)
+        self.assertEqual(ingredient_index.search('plan'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_dataset(10, 20)
+        after = get_model_versions(*models)
+        for model, old, new in zip(models, before, after):
+            with self.subTest(model=model.__name__):
+                self.assertNotEqual(old, new)
+        self.assertTrue(ingredient_index.search('plan'))
+
+
+class TimelineBackfillTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.authors = [create_user(f'author_{num}') for num in range(3)]
+        cls.heavy = create_user('heavy')
+        for author in (*cls.authors, cls.heavy):
+            for num in range(3):
+                create_recipe(author, f'recipe_{num}')
+            Follow.objects.create(user=cls.user, author=author)
+        # Ленту уже заполнили сигналы подписки; тесты заполняют её заново.
+        TimelineEntry.objects.all().delete()
+        User.objects.filter(pk=cls.heavy.pk).update(
+            followers_count=timeline.FEED_FANOUT_MAX_FOLLOWERS + 1
+        )
+
+    def follow_all(self):
+        return timeline.follow_authors(
+            self.user.id,
+            [author.id for author in (*self.authors, self.heavy)],
+        )
+
+    def test_backfills_all_authors_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.follow_all()
+        entries = TimelineEntry.objects.filter(user=self.user)
+        self.assertEqual(
+            set(entries.values_list('author_id', flat=True)),
+            {author.id for author in self.authors},
+        )
+        self.assertEqual(entries.count(), 3 * len(self.authors))
+
+    def test_keeps_latest_recipes_up_to_limit(self):
+        with mock.patch.object(timeline, 'FEED_BACKFILL_LIMIT', 2):
+            self.follow_all()
+        latest = Recipe.objects.filter(author=self.authors[0]).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)[:2]
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user, author=self.authors[0]
+            ).values_list('recipe_id', flat=True)),
+            set(latest),
+        )
+
+    def test_repeated_backfill_skips_existing_entries(self):
+        self.follow_all()
+        self.follow_all()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(),
+            3 * len(self.authors),
+        )
+
+
+class ImageProcessingTest(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+
+    def upload(self, content):
+        recipe = create_recipe(self.author)
+        recipe.image.save('upload.gif', ContentFile(content))
+        enqueue_image_processing(recipe)
+        return recipe
+
+    def process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            process_pending_images(IMAGE_TASK_MAX_ATTEMPTS)
+
+    def test_processed_upload_is_stored_once(self):
+        first = self.upload(SMALL_GIF)
+        second = self.upload(SMALL_GIF)
+        sources = (first.image.name, second.image.name)
+        self.process()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(first.stored_image, second.stored_image)
+        self.assertEqual(StoredImage.objects.count(), 1)
+        self.assertTrue(storage.exists(first.image.name))
+        for source in sources:
+            self.assertFalse(storage.exists(source))
+
+    def test_failed_upload_is_not_served(self):
+        recipe = self.upload(b'GIF89a' + b'\0' * 32)
+        source = recipe.image.name
+        self.process()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(recipe.image.name, '')
+        self.assertFalse(storage.exists(source))
+        self.assertFalse(ImageTask.objects.exists())
+
+    def test_superseded_upload_is_deleted(self):
+        recipe = self.upload(SMALL_GIF)
+        source = recipe.image.name
+        recipe.image.save('replacement.gif', ContentFile(SMALL_GIF))
+        self.process()
+        self.assertFalse(storage.exists(source))
+
+
+class IngredientImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = Path(self.directory) / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def test_reads_json_array_and_lines_in_small_chunks(self):
+        expected = [('соль', 'г'), ('вода', 'мл'), None]
+        for content in (
+            '[{"name": "соль", "measurement_unit": "г"},\n'
+            ' {"name": "вода", "measurement_unit": "мл"}, 1]',
+            '{"name": "соль", "measurement_unit": "г"}\n'
+            '{"name": "вода", "measurement_unit": "мл"}\n1\n',
+        ):
+            with self.subTest(content=content):
+                with mock.patch.object(importers, 'JSON_CHUNK_SIZE', 7):
+                    rows = list(importers.read_json(io.StringIO(content)))
+                self.assertEqual(rows, expected)
+
+    def test_imports_in_batches_skipping_bad_rows_and_duplicates(self):
+        path = self.write('ingredients.csv', '\n'.join((
+            'соль,г',
+            'вода,мл',
+            'соль,г',
+            'без единицы',
+            ' ,г',
+            f'{"x" * (importers.NAME_MAX_LENGTH + 1)},г',
+            'сахар,г',
+        )))
+        self.assertEqual(ingredient_index.search('сах'), [])
+        self.assertEqual(
+            importers.import_ingredients(importers.read_rows(path), 2),
+            (7, 3, 3),
+        )
+        self.assertEqual(
+            [item['name'] for item in ingredient_index.search('сах')],
+            ['сахар'],
+        )
+        self.assertEqual(
+            importers.import_ingredients(importers.read_rows(path), 2),
+            (7, 3, 0),
+        )
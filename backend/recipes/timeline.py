@@ -0,0 +1,112 @@
+from django.db import connection
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow, User
+
+# Авторам с большим числом подписчиков лента не рассылается при
+# публикации: их рецепты подмешиваются в ленту при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BACKFILL_LIMIT = 100
+FEED_BATCH_SIZE = 1000
+
+
+def is_fanned_out_on_read(author_id):
+    return User.objects.filter(
+        pk=author_id, followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS
+    ).exists()
+
+
+def fan_out_recipe(recipe):
+    """Кладёт новый рецепт в ленты всех подписчиков автора."""
+    if is_fanned_out_on_read(recipe.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe=recipe,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date,
+            )
+            for user_id in follower_ids.iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def follow_authors(user_id, author_ids):
+    """Добавляет в ленту последние рецепты новых авторов подписок."""
+    return backfill_timelines(
+        Follow.objects.filter(user_id=user_id, author_id__in=author_ids)
+    )
+
+
+def unfollow_authors(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def get_feed_querysets(recipes, user):
+    """Источники ленты user с общими ключами feed_date и feed_id.
+
+    Рецепты авторов с рассылкой при публикации берутся из записей ленты,
+    остальных авторов — одним запросом по author_id при чтении, без записи
+    в ленту.
+    """
+    followed = user.follower.values('author')
+    return (
+        recipes.in_feed_of(user, followed.filter(
+            author__followers_count__lte=FEED_FANOUT_MAX_FOLLOWERS
+        )),
+        recipes.by_authors_as_feed(followed.filter(
+            author__followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS
+        )),
+    )
+
+
+def fill_timelines(users):
+    """Заполняет ленты пользователей из queryset по всем их подпискам."""
+    return backfill_timelines(Follow.objects.filter(user__in=users))
+
+
+def backfill_timelines(follows):
+    """Кладёт в ленты рецепты авторов подписок follows одним INSERT ... SELECT.
+
+    От каждого автора с рассылкой при публикации в ленту попадают
+    последние FEED_BACKFILL_LIMIT рецептов; уже лежащие в ней пропускаются.
+    """
+    follows_sql, params = follows.values(
+        'user_id', 'author_id'
+    ).query.sql_with_params()
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    on_conflict = connection.ops.ignore_conflicts_suffix_sql(
+        ignore_conflicts=True
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {TimelineEntry._meta.db_table} '
+            '(user_id, recipe_id, author_id, pub_date) '
+            'SELECT follow.user_id, recipe.id, recipe.author_id, '
+            'recipe.pub_date '
+            f'FROM ({follows_sql}) follow '
+            'JOIN ('
+            'SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {Recipe._meta.db_table} '
+            f'WHERE author_id IN (SELECT author_id FROM ({follows_sql}) f)'
+            ') recipe ON recipe.author_id = follow.author_id '
+            f'JOIN {User._meta.db_table} author '
+            'ON author.id = follow.author_id '
+            'WHERE recipe.position <= %s '
+            f'AND author.followers_count <= %s {on_conflict}',
+            (
+                *params, *params,
+                FEED_BACKFILL_LIMIT, FEED_FANOUT_MAX_FOLLOWERS,
+            ),
+        )
+        return cursor.rowcount
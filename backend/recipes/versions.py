@@ -0,0 +1,74 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from recipes.models import ModelVersion
+
+# С общим кешем сдвиг версии виден всем процессам сразу; с кешем в памяти
+# процесса версия из другого процесса видна не позже чем через столько
+# секунд.
+MODEL_VERSION_CACHE_TIMEOUT = 5
+
+
+def get_version_key(model):
+    return model._meta.label_lower
+
+
+def get_cache_key(key):
+    return f'model_version:{key}'
+
+
+def get_model_versions(*models):
+    """Текущие версии данных моделей.
+
+    Версии хранятся в базе данных, поэтому запись из любого процесса,
+    например из команды импорта, видна всем веб-процессам. Прочитанные
+    версии кешируются: пока они в кеше, запросов к базе нет, иначе все
+    недостающие читаются одним запросом.
+    """
+    keys = [get_version_key(model) for model in models]
+    cached = cache.get_many([get_cache_key(key) for key in keys])
+    versions = {
+        key: cached[get_cache_key(key)]
+        for key in keys if get_cache_key(key) in cached
+    }
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        stored = dict(ModelVersion.objects.filter(
+            label__in=missing
+        ).values_list('label', 'version'))
+        loaded = {key: stored.get(key, 0) for key in missing}
+        cache.set_many(
+            {get_cache_key(key): version for key, version in loaded.items()},
+            MODEL_VERSION_CACHE_TIMEOUT,
+        )
+        versions.update(loaded)
+    return tuple(versions[key] for key in keys)
+
+
+def get_model_version(model):
+    return get_model_versions(model)[0]
+
+
+def bump_model_version(model):
+    """Сдвигает версию модели после любой записи."""
+    key = get_version_key(model)
+    if not ModelVersion.objects.filter(label=key).update(
+        version=F('version') + 1
+    ):
+        # Первая версия уникальна по времени, чтобы ключи кеша не совпали
+        # с оставшимися от прежней базы данных.
+        ModelVersion.objects.get_or_create(
+            label=key, defaults={'version': time.time_ns()}
+        )
+    # Внутри транзакции другие процессы до коммита видят старую версию и
+    # могут вернуть её в кеш, поэтому ключ удаляется и после коммита.
+    cache.delete(get_cache_key(key))
+    transaction.on_commit(lambda: cache.delete(get_cache_key(key)))
+
+
+def bump_model_version_on_commit(model):
+    """Сдвигает версию после коммита, когда новые данные уже видны."""
+    transaction.on_commit(lambda: bump_model_version(model))
@@ -39,6 +39,12 @@ class User(AbstractUser):
     password = models.CharField(
         _('password'), max_length=settings.USER_NAME_MAX_LENGTH
     )
+    recipes_count = models.PositiveIntegerField(
+        'количество рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'количество подписчиков', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -4,10 +4,23 @@ from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import LowercaseEmailField
 from rest_framework import serializers
 
+from recipes.models import Recipe
 
 User = get_user_model()
 
 
+def get_following_ids(request):
+    """Id авторов, на которых подписан пользователь, один запрос на request."""
+    if not hasattr(request, '_following_ids'):
+        request._following_ids = (
+            set() if request.user.is_anonymous
+            else set(request.user.follower.values_list(
+                'author_id', flat=True
+            ))
+        )
+    return request._following_ids
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     email = LowercaseEmailField()
 
@@ -27,10 +40,7 @@ class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return obj.following.filter(user_id=user.id).exists()
+        return obj.id in get_following_ids(self.context['request'])
 
     class Meta:
         model = User
@@ -44,22 +54,39 @@ class CustomUserSerializer(UserSerializer):
         )
 
 
+class SubscriptionRecipeSerializer(serializers.ModelSerializer):
+    """Краткое представление рецепта в подписках."""
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'cooking_time')
+
+
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса или None."""
+    try:
+        recipes_limit = int(request.GET['recipes_limit'])
+    except (MultiValueDictKeyError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
 class SubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     def get_recipes(self, obj):
-        author_recipes = obj.recipes.all()
-        try:
-            recipes_limit = self.context.get('request').GET['recipes_limit']
-            author_recipes = author_recipes[: int(recipes_limit)]
-        except (MultiValueDictKeyError, ValueError):
-            pass
-        return []
-
-    @staticmethod
-    def get_recipes_count(obj):
-        return obj.recipes.count()
+        """Рецепты из limited_recipes, подготовленных во вьюсете."""
+        if hasattr(obj, 'limited_recipes'):
+            author_recipes = obj.limited_recipes
+        else:
+            author_recipes = obj.recipes.order_by('-pub_date')
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                author_recipes = author_recipes[:recipes_limit]
+        return SubscriptionRecipeSerializer(
+            author_recipes, many=True, context=self.context
+        ).data
 
     class Meta:
         model = User
@@ -0,0 +1,202 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow, User
+
+RECIPES_PER_AUTHOR = 2
+
+
+class BatchSubscribeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.authors = [
+            User.objects.create(
+                username=f'author_{num}', email=f'author_{num}@example.com'
+            )
+            for num in range(10)
+        ]
+        for author in cls.authors:
+            for num in range(RECIPES_PER_AUTHOR):
+                Recipe.objects.create(
+                    author=author, name=f'recipe_{num}',
+                    image='recipes/images/recipe.png', text='text',
+                    cooking_time=10,
+                )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def subscribe(self, authors, method='post'):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                '/api/users/batch/subscribe/',
+                {'ids': [author.id for author in authors]}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_batch_size(self):
+        self.assertEqual(
+            self.subscribe(self.authors[:2]), self.subscribe(self.authors[2:])
+        )
+        self.assertEqual(
+            Follow.objects.filter(user=self.user).count(), len(self.authors)
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(),
+            len(self.authors) * RECIPES_PER_AUTHOR,
+        )
+
+    def test_unsubscribe_clears_timeline(self):
+        self.subscribe(self.authors)
+        self.subscribe(self.authors[:3], method='delete')
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user
+            ).values_list('author_id', flat=True)),
+            {author.id for author in self.authors[3:]},
+        )
+
+
+class SubscriptionsPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.authors = [
+            User.objects.create(
+                username=f'author_{num}', email=f'author_{num}@example.com'
+            )
+            for num in range(5)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_walks_all_authors(self):
+        url = '/api/users/subscriptions/?cursor=&limit=2'
+        usernames = []
+        while url:
+            data = self.client.get(url).json()
+            usernames += [author['username'] for author in data['results']]
+            url = data['next']
+        self.assertEqual(
+            usernames, [author.username for author in self.authors]
+        )
+
+
+class SubscriptionRecipesLimitTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.latest = {}
+        now = timezone.now()
+        for num in range(3):
+            author = User.objects.create(
+                username=f'author_{num}', email=f'author_{num}@example.com'
+            )
+            Follow.objects.create(user=cls.user, author=author)
+            recipes = [
+                Recipe.objects.create(
+                    author=author, name=f'recipe_{index}',
+                    image='recipes/images/recipe.png', text='text',
+                    cooking_time=10,
+                )
+                for index in range(3)
+            ]
+            for index, recipe in enumerate(recipes):
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    pub_date=now - timedelta(minutes=index)
+                )
+            cls.latest[author.username] = [recipe.id for recipe in recipes]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_recipes(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(
+                '/api/users/subscriptions/', params
+            ).json()
+        return len(queries), {
+            author['username']: (
+                [recipe['id'] for recipe in author['recipes']],
+                author['recipes_count'],
+            )
+            for author in data['results']
+        }
+
+    def test_keeps_latest_recipes_of_each_author(self):
+        _, authors = self.get_recipes({'limit': 10, 'recipes_limit': 2})
+        self.assertEqual(authors, {
+            username: (recipes[:2], 3)
+            for username, recipes in self.latest.items()
+        })
+
+    def test_invalid_limit_returns_all_recipes(self):
+        for recipes_limit in ('-1', 'many'):
+            with self.subTest(recipes_limit=recipes_limit):
+                _, authors = self.get_recipes(
+                    {'limit': 10, 'recipes_limit': recipes_limit}
+                )
+                self.assertEqual(authors, {
+                    username: (recipes, 3)
+                    for username, recipes in self.latest.items()
+                })
+
+    def test_queries_do_not_depend_on_page_size(self):
+        counts = {
+            self.get_recipes({'limit': limit, 'recipes_limit': 2})[0]
+            for limit in (1, 3)
+        }
+        self.assertEqual(len(counts), 1)
+
+
+class SubscribeToggleTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_toggle_is_idempotent(self):
+        path = f'/api/users/{self.author.id}/subscribe/'
+        for method, status, count in (
+            ('post', 201, 1), ('post', 400, 1),
+            ('delete', 204, 0), ('delete', 400, 0),
+        ):
+            response = getattr(self.client, method)(path)
+            self.assertEqual(response.status_code, status)
+            self.author.refresh_from_db()
+            self.assertEqual(self.author.followers_count, count)
+
+    def test_cannot_subscribe_to_self(self):
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
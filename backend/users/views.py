@@ -1,20 +1,60 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from djoser.views import UserViewSet
 from rest_framework import exceptions
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
 from api.pagination import CustomPagination
-from api.utils import create_or_delete_record
-from users.serializers import SubscriptionSerializer
+from api.serializers import BatchIdsSerializer
+from api.utils import create_or_delete_record, create_or_delete_records
+from recipes.models import Recipe
+from users.models import Follow
+from users.serializers import SubscriptionSerializer, get_recipes_limit
 
 User = get_user_model()
 
 
+def prefetch_limited_recipes(authors, recipes_limit):
+    """Первые recipes_limit рецептов каждого автора одним запросом.
+
+    Нумерует рецепты ROW_NUMBER() OVER (PARTITION BY author) и кладёт
+    результат в author.limited_recipes.
+    """
+    if not authors:
+        return
+    ranked = (
+        Recipe.objects.filter(author__in=[author.id for author in authors])
+        .only('id', 'name', 'image', 'cooking_time', 'author_id')
+        .annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('pub_date').desc(),
+        ))
+        .order_by()
+    )
+    sql, params = ranked.query.sql_with_params()
+    if recipes_limit is not None:
+        sql = f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s'
+        params = (*params, recipes_limit)
+    recipes_by_author = defaultdict(list)
+    for recipe in Recipe.objects.raw(
+        f'{sql} ORDER BY author_id, recipe_rank', params
+    ):
+        recipes_by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.limited_recipes = recipes_by_author[author.id]
+
+
 class CustomUserViewSet(UserViewSet):
     permission_classes = (IsAuthenticated,)
     pagination_class = CustomPagination
+    cursor_ordering = ('username', 'id')
 
     @action(
         detail=False,
@@ -25,10 +65,12 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         authors = self.request.user.follower.values('author__id')
         queryset = User.objects.filter(pk__in=authors)
-        serializer = self.get_serializer(
-            self.paginate_queryset(queryset), many=True
-        )
-
+        page = self.paginate_queryset(queryset)
+        authors = list(queryset) if page is None else page
+        prefetch_limited_recipes(authors, get_recipes_limit(request))
+        serializer = self.get_serializer(authors, many=True)
+        if page is None:
+            return Response(serializer.data)
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -39,13 +81,29 @@ class CustomUserViewSet(UserViewSet):
     def subscribe(self, request, id=None):
         user = self.request.user
         author = get_object_or_404(User, pk=id)
-        in_follow = user.follower.filter(author=author)
         if request.method == 'POST' and user == author:
             raise exceptions.ValidationError('you can`t subscribe to yourself')
 
         return create_or_delete_record(
             request=request,
-            record=in_follow,
-            serializer_data=self.get_serializer(author).data,
-            params={'author': author},
+            model=Follow,
+            serializer=self.get_serializer(author),
+            author=author,
+        )
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='batch/subscribe',
+    )
+    def subscribe_batch(self, request):
+        """Подписка на нескольких авторов или отписка от них."""
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return create_or_delete_records(
+            request=request,
+            model=Follow,
+            targets=User.objects.all(),
+            ids=serializer.validated_data['ids'],
+            excluded={request.user.id},
         )